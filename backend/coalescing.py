@@ -0,0 +1,54 @@
+"""
+Deduplicação de requisições idênticas concorrentes (single-flight)
+
+Quando várias abas (ou um duplo clique em "Processar") enviam o mesmo grafo
+ao mesmo tempo, apenas a primeira requisição dispara o processamento; as
+demais aguardam e recebem a mesma resposta já serializada.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+# Campos dos nós que só importam para a interface (não mudam o resultado)
+UI_ONLY_NODE_FIELDS = ('position',)
+
+
+def canonical_graph_key(payload: Dict[str, Any]) -> str:
+    """
+    Gera um hash canônico do grafo: nós (sem campos de interface) e arestas
+
+    A ordem das arestas é preservada porque define a ordem das entradas
+    de nós como DIFFERENCE
+    """
+    nodes = [
+        {key: value for key, value in node.items() if key not in UI_ONLY_NODE_FIELDS}
+        for node in payload.get('nodes', [])
+    ]
+    canonical = dict(payload, nodes=nodes)
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Compartilha uma única execução entre chamadas concorrentes com a mesma chave
+
+    A execução roda em uma task própria: se a requisição que a iniciou for
+    cancelada (cliente desconectou), as demais continuam aguardando o resultado
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.shared_calls = 0  # Quantas chamadas reaproveitaram uma execução em andamento
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared_calls += 1
+
+        return await asyncio.shield(task)
@@ -0,0 +1,146 @@
+"""
+Modelo de custo do grafo e controle de admissão
+
+O custo de um nó é estimado ANTES da execução, em "unidades" (aproximadamente
+operações elementares do laço interno), a partir de:
+- dimensões da imagem (propagadas dos nós de leitura pelas arestas, ou da
+  janela recortada quando há região de interesse)
+- tipo do nó, tipo de filtro e tamanho da janela
+
+Exemplos (n = pixels, k = tamanho da janela):
+- operação pontual, diferença, histograma: n
+- convolução/média: n·k²  (laplaciano: n·5, só pesos não nulos)
+- mediana: n·(k² + k⁴/4)  (coleta + insertion sort da janela)
+- mínimo/máximo (van Herk/Gil-Werman): n·6 por passada, qualquer k
+
+Com o custo estimado, o /process pode recusar grafos acima do orçamento ou
+colocá-los numa fila com poucas vagas para execução pesada. O custo real
+(segundos por nó) volta na resposta junto com a estimativa para calibrar
+o modelo (ver secondsPerUnit).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Passadas de mínimo/máximo de cada filtro de ordem
+RANK_FILTER_PASSES = {'minimo': 1, 'maximo': 1, 'abertura': 2, 'fechamento': 2}
+
+
+def estimate_node_cost(node: Dict, width: int, height: int) -> float:
+    """
+    Custo estimado de um nó para uma imagem width×height
+    """
+    pixels = width * height
+    node_type = node['type']
+    params = node.get('data', {})
+
+    if node_type == 'CONVOLUTION':
+        filter_type = params.get('filterType', 'convolution')
+        window = params.get('kernelSize', 3) ** 2
+        if filter_type == 'mediana':
+            return pixels * (window + window * window / 4)
+        if filter_type == 'laplacian':
+            return pixels * 5
+        if filter_type in RANK_FILTER_PASSES:
+            return pixels * 6 * RANK_FILTER_PASSES[filter_type]
+        return pixels * window
+
+    if node_type in ('POINT_OP', 'DIFFERENCE', 'HISTOGRAM'):
+        return float(pixels)
+    if node_type == 'SAVE':
+        return pixels * 2.0  # Formatação de texto de cada pixel
+    return 0.0  # RAW_READER e DISPLAY só repassam o buffer
+
+
+def estimate_graph(nodes: List[Dict], sizes: Dict[str, Tuple[int, int]]) -> Dict[str, Any]:
+    """
+    Estima o custo de cada nó e o total do grafo
+
+    `sizes` traz as dimensões que cada nó processa: o quadro inteiro
+    (propagado dos nós de leitura, ver regions.propagate_sizes) ou, com
+    região de interesse, só a janela recortada
+    """
+    per_node = {}
+    for node in nodes:
+        width, height = sizes.get(node['id'], (0, 0))
+        per_node[node['id']] = estimate_node_cost(node, width, height)
+
+    return {"total": sum(per_node.values()), "nodes": per_node}
+
+
+def cost_report(estimate: Dict[str, Any], node_seconds: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Junta estimativa e custo real para calibração do modelo
+    """
+    total_seconds = sum(node_seconds.values())
+    return {
+        "estimatedUnits": estimate["total"],
+        "actualSeconds": round(total_seconds, 6),
+        "secondsPerUnit": total_seconds / estimate["total"] if estimate["total"] else None,
+        "nodes": {
+            node_id: {
+                "estimatedUnits": units,
+                "actualSeconds": round(node_seconds[node_id], 6) if node_id in node_seconds else None
+            }
+            for node_id, units in estimate["nodes"].items()
+        }
+    }
+
+
+class GraphRejected(Exception):
+    """
+    Grafo recusado pelo controle de admissão (status_code indica o motivo)
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """
+    Admissão por custo estimado
+    - custo > max_cost: recusado (413)
+    - custo > heavy_cost: espera uma das `heavy_slots` vagas de execução pesada;
+      se já houver `max_queued` grafos pesados esperando, recusado (429)
+    - demais: executam direto
+    """
+
+    def __init__(self, max_cost: float, heavy_cost: float, heavy_slots: int = 1, max_queued: int = 8):
+        self.max_cost = max_cost
+        self.heavy_cost = heavy_cost
+        self.max_queued = max_queued
+        self.queued = 0
+        self._heavy = asyncio.Semaphore(heavy_slots)
+
+    def check(self, cost: float) -> None:
+        if self.max_cost and cost > self.max_cost:
+            raise GraphRejected(
+                f"Grafo muito custoso: {cost:.3g} unidades estimadas (limite {self.max_cost:.3g})",
+                status_code=413
+            )
+
+    async def run(self, cost: float, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        self.check(cost)
+        if not self.heavy_cost or cost <= self.heavy_cost:
+            return await fn()
+
+        if self._heavy.locked():
+            if self.queued >= self.max_queued:
+                raise GraphRejected("Fila de execução pesada cheia, tente novamente", status_code=429)
+
+            self.queued += 1
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                await asyncio.wait_for(self._heavy.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise GraphRejected("Tempo limite excedido aguardando na fila", status_code=504)
+            finally:
+                self.queued -= 1
+        else:
+            await self._heavy.acquire()  # Vaga livre: não passa pela fila
+
+        try:
+            return await fn()
+        finally:
+            self._heavy.release()
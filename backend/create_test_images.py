@@ -1,23 +1,29 @@
 """
 Script para criar imagens RAW de teste
 Execução: python create_test_images.py
+
+As funções generate_* devolvem os pixels (lista 0-255) sem gravar nada,
+para serem reaproveitadas por outros scripts (ex: loadtest.py)
 """
 import os
 
-def create_gradient_image(width, height, filename):
-    """Cria uma imagem com gradiente horizontal"""
+def write_raw(image, width, height, filename):
+    """Grava os pixels em formato RAW (1 byte por pixel)"""
+    with open(filename, 'wb') as f:
+        f.write(bytes(image))
+    print(f"✓ Criado: {filename} ({width}x{height})")
+
+def generate_gradient(width, height):
+    """Gradiente horizontal"""
     image = []
     for y in range(height):
         for x in range(width):
             value = int((x / width) * 255)
             image.append(value)
+    return image
 
-    with open(filename, 'wb') as f:
-        f.write(bytes(image))
-    print(f"✓ Criado: {filename} ({width}x{height})")
-
-def create_checkerboard_image(width, height, square_size, filename):
-    """Cria uma imagem com padrão de tabuleiro de xadrez"""
+def generate_checkerboard(width, height, square_size):
+    """Padrão de tabuleiro de xadrez"""
     image = []
     for y in range(height):
         for x in range(width):
@@ -25,13 +31,10 @@ def create_checkerboard_image(width, height, square_size, filename):
                 image.append(255)
             else:
                 image.append(0)
+    return image
 
-    with open(filename, 'wb') as f:
-        f.write(bytes(image))
-    print(f"✓ Criado: {filename} ({width}x{height})")
-
-def create_circle_image(width, height, filename):
-    """Cria uma imagem com um círculo branco no centro"""
+def generate_circle(width, height):
+    """Círculo branco no centro"""
     image = []
     center_x = width // 2
     center_y = height // 2
@@ -44,31 +47,41 @@ def create_circle_image(width, height, filename):
                 image.append(255)
             else:
                 image.append(0)
+    return image
 
-    with open(filename, 'wb') as f:
-        f.write(bytes(image))
-    print(f"✓ Criado: {filename} ({width}x{height})")
-
-def create_noise_image(width, height, filename):
-    """Cria uma imagem com ruído aleatório"""
+def generate_noise(width, height):
+    """Ruído aleatório"""
     import random
-    image = [random.randint(0, 255) for _ in range(width * height)]
-
-    with open(filename, 'wb') as f:
-        f.write(bytes(image))
-    print(f"✓ Criado: {filename} ({width}x{height})")
+    return [random.randint(0, 255) for _ in range(width * height)]
 
-def create_vertical_gradient(width, height, filename):
-    """Cria uma imagem com gradiente vertical"""
+def generate_vertical_gradient(width, height):
+    """Gradiente vertical"""
     image = []
     for y in range(height):
         for x in range(width):
             value = int((y / height) * 255)
             image.append(value)
+    return image
 
-    with open(filename, 'wb') as f:
-        f.write(bytes(image))
-    print(f"✓ Criado: {filename} ({width}x{height})")
+def create_gradient_image(width, height, filename):
+    """Cria uma imagem com gradiente horizontal"""
+    write_raw(generate_gradient(width, height), width, height, filename)
+
+def create_checkerboard_image(width, height, square_size, filename):
+    """Cria uma imagem com padrão de tabuleiro de xadrez"""
+    write_raw(generate_checkerboard(width, height, square_size), width, height, filename)
+
+def create_circle_image(width, height, filename):
+    """Cria uma imagem com um círculo branco no centro"""
+    write_raw(generate_circle(width, height), width, height, filename)
+
+def create_noise_image(width, height, filename):
+    """Cria uma imagem com ruído aleatório"""
+    write_raw(generate_noise(width, height), width, height, filename)
+
+def create_vertical_gradient(width, height, filename):
+    """Cria uma imagem com gradiente vertical"""
+    write_raw(generate_vertical_gradient(width, height), width, height, filename)
 
 if __name__ == '__main__':
     # Criar diretório de exemplos
@@ -0,0 +1,234 @@
+"""
+Armazenamento de imagens compartilhado entre processos (workers do uvicorn)
+
+Cada imagem é gravada uma única vez como um arquivo de pixels uint8 em um
+diretório compartilhado (por padrão em /dev/shm, ou seja, em memória) e lida
+via mmap: todos os workers enxergam as mesmas páginas físicas, sem copiar
+pixels entre processos.
+
+Layout do diretório:
+- <id>.u8     → pixels crus (1 byte por pixel, linha a linha)
+- index.json  → índice pequeno {id: {width, height, nbytes}}
+- index.lock  → trava usada para atualizar o índice
+
+O id é o hash das dimensões + conteúdo: reenviar a mesma imagem reaproveita
+a entrada, e os mesmos bytes com outras dimensões viram outra imagem.
+
+O total de bytes é limitado (max_bytes): ao gravar, as imagens menos usadas
+são removidas sob a mesma trava do índice. O "uso recente" é o mtime do
+arquivo, atualizado a cada leitura, e vale para todos os workers. Mapas
+já abertos de uma imagem removida continuam válidos: o processo só esquece
+o mapa, que é fechado quando o último grafo que lê os pixels terminar
+(o arquivo some do diretório, mas as páginas só são liberadas no fim).
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+def default_store_root() -> str:
+    """
+    Diretório padrão: PSE_IMAGE_STORE, ou /dev/shm (memória compartilhada), ou o temp do sistema
+    """
+    configured = os.environ.get('PSE_IMAGE_STORE')
+    if configured:
+        return configured
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'pse_image_store')
+    return os.path.join(tempfile.gettempdir(), 'pse_image_store')
+
+
+class ImageStore:
+    """
+    Armazena imagens em arquivos mapeados em memória com um índice compartilhado
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = 1024 * 1024 * 1024):
+        self.root = root or default_store_root()
+        self.max_bytes = max_bytes  # 0 = sem limite
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.json')
+        self._lock_path = os.path.join(self.root, 'index.lock')
+        self._index: Dict[str, Dict[str, int]] = {}  # Cópia local do índice
+        self._maps: Dict[str, memoryview] = {}  # Mapas abertos neste processo
+        # put() roda no event loop e get() nas threads dos grafos
+        self._lock = threading.Lock()
+        self.evictions = 0  # Imagens removidas por este processo
+
+    def _data_path(self, image_id: str) -> str:
+        return os.path.join(self.root, f"{image_id}.u8")
+
+    def _read_index(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self._index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Trava exclusiva entre processos para alterar o índice e os arquivos
+        """
+        with open(self._lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_index(self, index: Dict[str, Dict[str, int]]) -> None:
+        """
+        A troca do arquivo é atômica (os.replace): leitores sem trava nunca
+        veem um índice pela metade
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+        with self._lock:
+            self._index = index
+
+    def _evict(self, index: Dict[str, Dict[str, int]], keep: str) -> None:
+        """
+        Remove as imagens menos usadas até caber em max_bytes (nunca `keep`,
+        a que acabou de ser gravada)
+        """
+        total = sum(entry["nbytes"] for entry in index.values())
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+
+        def last_used(image_id: str) -> float:
+            try:
+                return os.stat(self._data_path(image_id)).st_mtime
+            except FileNotFoundError:
+                return 0.0
+
+        for image_id in sorted(index, key=last_used):
+            if total <= self.max_bytes:
+                break
+            if image_id == keep:
+                continue
+            total -= index.pop(image_id)["nbytes"]
+            try:
+                os.remove(self._data_path(image_id))
+            except FileNotFoundError:
+                pass
+            self._close_map(image_id)
+            self.evictions += 1
+
+    def _close_map(self, image_id: str) -> None:
+        """
+        Esquece o mapa da imagem neste processo (sem liberar a memoryview,
+        que pode estar em uso por um grafo): o mapa fecha quando a última
+        referência sair
+        """
+        with self._lock:
+            self._maps.pop(image_id, None)
+
+    def put(self, pixels: Any, width: int, height: int) -> str:
+        """
+        Grava os pixels (bytes-like, valores 0-255) e retorna o id da imagem
+        """
+        pixels = bytes(pixels)
+        if width <= 0 or height <= 0 or width * height != len(pixels):
+            raise ValueError(
+                f"Dimensões inválidas: {width}×{height} para {len(pixels)} pixels"
+            )
+
+        image_id = hashlib.sha256(f"{width}x{height}:".encode() + pixels).hexdigest()[:32]
+        data_path = self._data_path(image_id)
+        entry = {"width": width, "height": height, "nbytes": len(pixels)}
+
+        # Já gravada (por este ou outro worker): só marca como usada
+        if self._index.get(image_id) == entry:
+            try:
+                os.utime(data_path)
+                return image_id
+            except FileNotFoundError:
+                pass  # Removida por outro worker: grava de novo
+
+        with self._locked():
+            if not os.path.exists(data_path):
+                # Escrita atômica: outro worker nunca mapeia um arquivo incompleto
+                fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(pixels)
+                os.replace(tmp_path, data_path)
+            else:
+                os.utime(data_path)
+
+            index = self._read_index()
+            index[image_id] = entry
+            self._evict(index, keep=image_id)
+            self._write_index(index)
+
+        # Mapas de imagens removidas por outros workers
+        with self._lock:
+            for stale_id in [mapped_id for mapped_id in self._maps if mapped_id not in index]:
+                del self._maps[stale_id]
+
+        return image_id
+
+    def get(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna {width, height, data} com data sendo uma memoryview (somente
+        leitura) sobre o arquivo mapeado; None se a imagem não existir
+        """
+        entry = self._index.get(image_id)
+        if entry is None:
+            # Pode ter sido gravada por outro worker: relê o índice
+            index = self._read_index()
+            with self._lock:
+                self._index = index
+            entry = index.get(image_id)
+            if entry is None:
+                return None
+
+        # Marca como usada (LRU); se sumiu, foi removida por outro worker
+        try:
+            os.utime(self._data_path(image_id))
+        except FileNotFoundError:
+            with self._lock:
+                self._maps.pop(image_id, None)
+                self._index.pop(image_id, None)
+            return None
+
+        with self._lock:
+            data = self._maps.get(image_id)
+            if data is None:
+                try:
+                    with open(self._data_path(image_id), 'rb') as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except FileNotFoundError:
+                    return None
+                data = memoryview(mapped)
+                self._maps[image_id] = data
+
+        return {
+            "width": entry["width"],
+            "height": entry["height"],
+            "data": data
+        }
+
+    def stats(self) -> Dict[str, int]:
+        index = self._read_index()
+        return {
+            "images": len(index),
+            "bytes": sum(entry["nbytes"] for entry in index.values()),
+            "maxBytes": self.max_bytes,
+            "evictionsInProcess": self.evictions,
+            "mappedInProcess": len(self._maps)
+        }
@@ -0,0 +1,79 @@
+"""
+Decodificação de formatos comuns (JPG, PNG, TIFF, ...) direto para buffers uint8
+
+- O Pillow decodifica em modo 'L' (escala de cinza) e entrega os pixels via
+  tobytes(), sem criar um int Python por pixel
+- max_width/max_height limitam a resolução: JPEG usa o modo draft (o
+  decodificador reduz por 1/2, 1/4 ou 1/8 enquanto lê, sem ficar abaixo do
+  tamanho pedido) e o ajuste final ao limite exato é um resize com
+  reducing_gap (reduce() inteiro primeiro, depois filtragem só no resto)
+- TIFFs com várias páginas são decodificados quadro a quadro; nos demais
+  formatos (inclusive GIF/WebP animados) só o primeiro quadro é usado
+"""
+import io
+from typing import Dict, Iterator
+
+from PIL import Image, ImageSequence
+
+
+def fits(width: int, height: int, max_width: int, max_height: int) -> bool:
+    """
+    Verifica se as dimensões cabem nos limites (0 = sem limite)
+    """
+    return (max_width <= 0 or width <= max_width) and (max_height <= 0 or height <= max_height)
+
+
+def fit_size(width: int, height: int, max_width: int, max_height: int) -> tuple:
+    """
+    Maior tamanho que cabe nos limites mantendo a proporção
+    """
+    scale = min(
+        max_width / width if max_width > 0 else 1.0,
+        max_height / height if max_height > 0 else 1.0,
+    )
+    target_width = min(max_width or width, max(1, round(width * scale)))
+    target_height = min(max_height or height, max(1, round(height * scale)))
+    return target_width, target_height
+
+
+def decode_frame(frame: Image.Image, max_width: int = 0, max_height: int = 0) -> Dict:
+    """
+    Decodifica um quadro para escala de cinza uint8 respeitando os limites
+    """
+    original_width, original_height = frame.size
+
+    target = None
+    if not fits(original_width, original_height, max_width, max_height):
+        target = fit_size(original_width, original_height, max_width, max_height)
+        # JPEG: decodifica direto em cinza e em escala reduzida (ignorado pelos outros formatos)
+        # O draft escolhe a maior redução (1/2, 1/4, 1/8) que ainda cobre o tamanho pedido
+        frame.draft('L', target)
+
+    if frame.mode != 'L':
+        frame = frame.convert('L')
+
+    if target is not None and frame.size != target:
+        # Ajuste exato ao limite: reduce() inteiro enquanto sobrar 2× o alvo, depois reamostragem
+        frame = frame.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    width, height = frame.size
+
+    return {
+        "width": width,
+        "height": height,
+        "pixels": frame.tobytes(),  # 1 byte por pixel, linha a linha
+        "originalWidth": original_width,
+        "originalHeight": original_height
+    }
+
+
+def decode_image(contents: bytes, max_width: int = 0, max_height: int = 0) -> Iterator[Dict]:
+    """
+    Gera os quadros decodificados da imagem: todas as páginas de um TIFF,
+    só o primeiro quadro nos demais formatos
+    """
+    image = Image.open(io.BytesIO(contents))
+    if image.format != 'TIFF':
+        yield decode_frame(image, max_width, max_height)
+        return
+    for frame in ImageSequence.Iterator(image):
+        yield decode_frame(frame, max_width, max_height)
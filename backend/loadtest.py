@@ -0,0 +1,474 @@
+"""
+Teste de carga do backend (asyncio, sem dependências externas)
+
+Sobe um servidor local (uvicorn main:app), dispara requisições concorrentes
+a /process e /upload-raw com uma mistura de grafos realistas montados a partir
+das imagens de create_test_images.py e mede:
+- vazão (requisições/s) e taxa de erro
+- latência p50/p95/p99 (geral e por cenário)
+- CPU e RSS do servidor (processo principal + workers) ao longo do tempo
+
+Os resultados são gravados em JSON para comparar execuções.
+
+Exemplos:
+    python loadtest.py --concurrency 50 --duration 30
+    python loadtest.py --workers 4 --size 128 --compare loadtest_results/anterior.json
+    python loadtest.py --url http://localhost:8000   (usa um servidor já rodando)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from create_test_images import (
+    generate_checkerboard,
+    generate_circle,
+    generate_gradient,
+    generate_noise,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ============ CLIENTE HTTP MÍNIMO ============
+
+
+class HttpConnection:
+    """
+    Conexão HTTP/1.1 keep-alive sobre asyncio (um usuário virtual = uma conexão)
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", content_type: str = "application/json") -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        )
+        try:
+            self.writer.write(head.encode("latin-1") + body)
+            await self.writer.drain()
+            return await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Conexão fechada pelo servidor")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            body = b"".join(chunks)
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, body
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+def multipart_body(filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("latin-1") + content + f"\r\n--{boundary}--\r\n".encode("latin-1")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# ============ CENÁRIOS ============
+
+
+def reader(node_id: str, pixels: List[int], size: int) -> Dict:
+    return {"id": node_id, "type": "RAW_READER", "data": {"width": size, "height": size, "imageData": pixels}}
+
+
+def chain(nodes: List[Dict]) -> Dict:
+    edges = [
+        {"id": f"e{i}", "source": nodes[i]["id"], "target": nodes[i + 1]["id"]}
+        for i in range(len(nodes) - 1)
+    ]
+    return {"nodes": nodes, "edges": edges, "outputs": [nodes[-1]["id"]]}
+
+
+def build_scenarios(size: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Mistura de fluxos típicos da interface (ver exemplos do README)
+    Cada cenário é uma função que devolve (método, caminho, corpo, content-type)
+    """
+    images = {
+        "gradient": generate_gradient(size, size),
+        "checkerboard": generate_checkerboard(size, size, max(1, size // 16)),
+        "circle": generate_circle(size, size),
+        "noise": generate_noise(size, size),
+    }
+
+    def process(graph: Dict):
+        return "POST", "/process", json.dumps(graph).encode(), "application/json"
+
+    def denoise():
+        return process(chain([
+            reader("r", images["noise"], size),
+            {"id": "m", "type": "CONVOLUTION", "data": {"filterType": "mediana", "kernelSize": rng.choice([3, 5])}},
+            {"id": "d", "type": "DISPLAY", "data": {}},
+        ]))
+
+    def edges_pipeline():
+        return process(chain([
+            reader("r", images["circle"], size),
+            {"id": "a", "type": "CONVOLUTION", "data": {"filterType": "media", "kernelSize": 3}},
+            {"id": "l", "type": "CONVOLUTION", "data": {"filterType": "laplacian", "kernelSize": 3}},
+            {"id": "d", "type": "DISPLAY", "data": {}},
+        ]))
+
+    def threshold():
+        # Limiar varia como um slider: parte das requisições coincide, parte não
+        return process(chain([
+            reader("r", images["gradient"], size),
+            {"id": "p", "type": "POINT_OP", "data": {"operation": "threshold", "value": rng.randrange(0, 256, 16)}},
+            {"id": "h", "type": "HISTOGRAM", "data": {}},
+        ]))
+
+    def difference():
+        graph = {
+            "nodes": [
+                reader("r", images["checkerboard"], size),
+                {"id": "a", "type": "CONVOLUTION", "data": {"filterType": "media", "kernelSize": 5}},
+                {"id": "x", "type": "DIFFERENCE", "data": {}},
+                {"id": "d", "type": "DISPLAY", "data": {}},
+            ],
+            "edges": [
+                {"id": "e1", "source": "r", "target": "a"},
+                {"id": "e2", "source": "r", "target": "x"},
+                {"id": "e3", "source": "a", "target": "x"},
+                {"id": "e4", "source": "x", "target": "d"},
+            ],
+            "outputs": ["d"],
+        }
+        return process(graph)
+
+    def upload():
+        body, content_type = multipart_body("load.raw", bytes(images[rng.choice(list(images))]))
+        return "POST", f"/upload-raw?width={size}&height={size}", body, content_type
+
+    return {
+        "denoise": (denoise, 3),
+        "edges": (edges_pipeline, 2),
+        "threshold": (threshold, 3),
+        "difference": (difference, 1),
+        "upload": (upload, 2),
+    }
+
+
+# ============ MÉTRICAS DO SERVIDOR ============
+
+
+def process_tree(root_pid: int) -> List[int]:
+    """
+    PID do servidor e de todos os descendentes (workers), via /proc
+    """
+    children: Dict[int, List[int]] = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+
+    pids, queue = [], [root_pid]
+    while queue:
+        pid = queue.pop()
+        pids.append(pid)
+        queue.extend(children.get(pid, []))
+    return pids
+
+
+def read_usage(pids: List[int]) -> Tuple[float, int]:
+    """
+    (segundos de CPU acumulados, RSS em bytes) somados sobre os processos
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    cpu_seconds, rss = 0.0, 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page_size
+        except OSError:
+            continue
+        cpu_seconds += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+    return cpu_seconds, rss
+
+
+async def sample_server(pid: Optional[int], samples: List[Dict], started: float, interval: float) -> None:
+    if pid is None or not os.path.isdir("/proc"):
+        return
+    last_cpu, last_time = read_usage(process_tree(pid))[0], time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        cpu, rss = read_usage(process_tree(pid))
+        now = time.perf_counter()
+        samples.append({
+            "t": round(now - started, 3),
+            "cpuPercent": round(100.0 * (cpu - last_cpu) / (now - last_time), 1),
+            "rssBytes": rss,
+        })
+        last_cpu, last_time = cpu, now
+
+
+# ============ EXECUÇÃO ============
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "errorRate": round(errors / total, 4) if total else 0.0,
+        "throughput": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50Ms": percentile(ordered, 50),
+        "p95Ms": percentile(ordered, 95),
+        "p99Ms": percentile(ordered, 99),
+    }
+
+
+async def virtual_user(host, port, scenarios, weights, rng, deadline, remaining, records) -> None:
+    connection = HttpConnection(host, port)
+    names = list(scenarios)
+    try:
+        while time.perf_counter() < deadline and (remaining is None or remaining[0] > 0):
+            if remaining is not None:
+                remaining[0] -= 1
+            name = rng.choices(names, weights=weights)[0]
+            method, path, body, content_type = scenarios[name][0]()
+
+            start = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, body, content_type)
+                ok = 200 <= status < 300
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+                status, ok = 0, False
+            records.append((name, (time.perf_counter() - start) * 1000.0, ok, status))
+    finally:
+        await connection.close()
+
+
+async def run_load(args, host: str, port: int, pid: Optional[int]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(args.size, rng)
+    if args.scenarios:
+        scenarios = {name: scenarios[name] for name in args.scenarios.split(",")}
+    weights = [weight for _, weight in scenarios.values()]
+
+    records: List[Tuple[str, float, bool, int]] = []
+    samples: List[Dict] = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    sampler = asyncio.ensure_future(sample_server(pid, samples, started, args.sample_interval))
+    users = [
+        virtual_user(host, port, scenarios, weights, random.Random(args.seed + i), deadline, remaining, records)
+        for i in range(args.concurrency)
+    ]
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+
+    per_scenario = {}
+    for name in scenarios:
+        ok = [latency for scenario, latency, success, _ in records if scenario == name and success]
+        failed = sum(1 for scenario, _, success, _ in records if scenario == name and not success)
+        per_scenario[name] = summarize(ok, failed, elapsed)
+
+    statuses: Dict[str, int] = {}
+    for _, _, _, status in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "size": args.size,
+            "workers": args.workers,
+            "seed": args.seed,
+            "scenarios": list(scenarios),
+        },
+        "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsedSeconds": round(elapsed, 3),
+        "overall": summarize([r[1] for r in records if r[2]], sum(1 for r in records if not r[2]), elapsed),
+        "scenarios": per_scenario,
+        "statusCodes": statuses,
+        "server": {
+            "samples": samples,
+            "peakRssBytes": max((s["rssBytes"] for s in samples), default=None),
+            "meanCpuPercent": round(sum(s["cpuPercent"] for s in samples) / len(samples), 1) if samples else None,
+        },
+    }
+
+
+async def wait_until_healthy(host: str, port: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        connection = HttpConnection(host, port)
+        try:
+            status, _ = await connection.request("GET", "/health")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await connection.close()
+        if time.perf_counter() > deadline:
+            raise RuntimeError("Servidor não respondeu a /health a tempo")
+        await asyncio.sleep(0.2)
+
+
+def start_server(port: int, workers: int, no_cache: bool) -> subprocess.Popen:
+    env = dict(os.environ)
+    if no_cache:
+        env["PSE_CACHE_DIR"] = ""
+        env["PSE_MEMORY_CACHE_BYTES"] = "0"
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    def fmt(value, unit=""):
+        return "-" if value is None else f"{value:.1f}{unit}" if isinstance(value, float) else f"{value}{unit}"
+
+    print(f"\n{'cenário':<12}{'req':>7}{'req/s':>9}{'erros':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = [("TOTAL", result["overall"])] + list(result["scenarios"].items())
+    for name, summary in rows:
+        print(
+            f"{name:<12}{summary['requests']:>7}{fmt(summary['throughput']):>9}"
+            f"{fmt(summary['errorRate'] * 100, '%'):>8}{fmt(summary['p50Ms'], 'ms'):>10}"
+            f"{fmt(summary['p95Ms'], 'ms'):>10}{fmt(summary['p99Ms'], 'ms'):>10}"
+        )
+
+    server = result["server"]
+    if server["samples"]:
+        print(f"\nServidor: CPU média {server['meanCpuPercent']}%, RSS pico {server['peakRssBytes'] / 2**20:.1f} MB")
+
+    if baseline is not None:
+        print("\nComparação com a execução anterior (TOTAL):")
+        for key in ("throughput", "p50Ms", "p95Ms", "p99Ms", "errorRate"):
+            old, new = baseline["overall"].get(key), result["overall"].get(key)
+            if old:
+                print(f"  {key:<11}{fmt(old):>10} → {fmt(new):>10}  ({(new - old) / old * 100:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Teste de carga do PSE-Image backend")
+    parser.add_argument("--concurrency", type=int, default=50, help="usuários virtuais simultâneos")
+    parser.add_argument("--duration", type=float, default=30.0, help="duração máxima em segundos")
+    parser.add_argument("--requests", type=int, default=0, help="total de requisições (0 = até acabar o tempo)")
+    parser.add_argument("--size", type=int, default=64, help="lado das imagens de teste (pixels)")
+    parser.add_argument("--scenarios", default="", help="subconjunto separado por vírgula (denoise,edges,threshold,difference,upload)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="workers do uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default="", help="usar um servidor já rodando em vez de subir um")
+    parser.add_argument("--no-cache", action="store_true", help="desativa o cache de nós no servidor local")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="intervalo de amostragem de CPU/RSS (s)")
+    parser.add_argument("--output", default="", help="arquivo JSON de saída")
+    parser.add_argument("--compare", default="", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, pid = parts.hostname, parts.port or 80, None
+    else:
+        host, port = "127.0.0.1", args.port
+        server = start_server(port, args.workers, args.no_cache)
+        pid = server.pid
+
+    try:
+        if server is not None:
+            asyncio.run(wait_until_healthy(host, port, timeout=30.0))
+        print(f"Carga: {args.concurrency} usuários, {args.duration:.0f}s, imagens {args.size}×{args.size} → {host}:{port}")
+        result = asyncio.run(run_load(args, host, port, pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    output = args.output or os.path.join(BACKEND_DIR, "loadtest_results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResultados gravados em {output}")
+
+
+if __name__ == "__main__":
+    main()
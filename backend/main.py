@@ -1,11 +1,21 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
 from models import ProcessRequest, ProcessResponse, ImageData
-from processor import ImageProcessor
+from processor import CODE_VERSION, GraphCancelled, ImageProcessor, MemoryBudgetExceeded
+from cost import AdmissionController, GraphRejected, cost_report
+from coalescing import SingleFlight, canonical_graph_key
+from image_store import ImageStore
+from ingest import decode_image
+from node_cache import NodeCache
+from session import EditingSession
+from tracing import ArrivalTimeMiddleware, Tracer, NULL_TRACER, now_us, validate_profile_mode
+from typing import Optional
+from pydantic import ValidationError
 import os
-from PIL import Image
-import io
+import json
+import time
 
 app = FastAPI(title="PSE-Image Backend", version="1.0.0")
 
@@ -16,45 +26,224 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-PSE-Trace"],
 )
 
-processor = ImageProcessor()
+# Marca a chegada das requisições (tempo de validação no modo de perfilamento)
+app.add_middleware(ArrivalTimeMiddleware)
+
+# Imagens enviadas ficam em um armazenamento compartilhado entre workers
+image_store = ImageStore(max_bytes=int(os.environ.get("PSE_IMAGE_STORE_BYTES", 1024 * 1024 * 1024)))
+
+# Cache de saídas de nós: memória e disco (PSE_CACHE_DIR vazio desativa o disco)
+node_cache = NodeCache(
+    CODE_VERSION,
+    disk_root=os.environ.get("PSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "nodes")),
+    memory_max_bytes=int(os.environ.get("PSE_MEMORY_CACHE_BYTES", 64 * 1024 * 1024)),
+    disk_max_bytes=int(os.environ.get("PSE_DISK_CACHE_BYTES", 512 * 1024 * 1024)),
+)
+processor = ImageProcessor(image_store=image_store, cache=node_cache)
+
+# Orçamento de memória padrão por requisição (bytes, 0 = ilimitado)
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("PSE_MEMORY_BUDGET", "0")) or None
+
+# Requisições idênticas concorrentes compartilham uma única execução
+process_flight = SingleFlight()
+
+# Admissão por custo estimado (unidades ≈ operações do laço interno, ver cost.py; 0 = sem limite)
+admission = AdmissionController(
+    max_cost=float(os.environ.get("PSE_MAX_GRAPH_COST", 1.2e9)),
+    heavy_cost=float(os.environ.get("PSE_HEAVY_GRAPH_COST", 1e8)),
+    heavy_slots=int(os.environ.get("PSE_HEAVY_SLOTS", 1)),
+    max_queued=int(os.environ.get("PSE_MAX_QUEUED", 8)),
+)
+
+# Prazo padrão de uma requisição /process (segundos)
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("PSE_REQUEST_TIMEOUT", 120))
+
+# Modo de perfilamento (X-PSE-Profile / campo profile): desligado por padrão,
+# pois cada requisição perfilada grava arquivos no servidor
+PROFILING_ENABLED = os.environ.get("PSE_PROFILING", "0") == "1"
+TRACE_DIR = os.environ.get("PSE_TRACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces"))
+TRACE_MAX_FILES = int(os.environ.get("PSE_TRACE_MAX_FILES", 200))  # Os mais antigos são removidos
 
 @app.get("/")
 def read_root():
     return {
         "message": "PSE-Image Backend API",
         "version": "1.0.0",
-        "endpoints": ["/process", "/health"]
+        "endpoints": ["/process", "/health", "/upload-raw", "/images/stats", "/cache/stats", "/ws/session"]
     }
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+def store_image(pixels, width: int, height: int):
+    """
+    Grava a imagem no armazenamento compartilhado e retorna seu id
+    (None se os valores não couberem em 8 bits)
+    """
+    try:
+        return image_store.put(pixels, width, height)
+    except ValueError:
+        return None
+
+def jsonable_results(results: dict) -> dict:
+    """
+    Buffers sem cópia (memoryview/bytes do armazenamento) viram listas para o JSON
+    """
+    for result in results.values():
+        if isinstance(result, dict) and isinstance(result.get('data'), (memoryview, bytes, bytearray)):
+            result['data'] = list(result['data'])
+    return results
+
+def run_graph(payload: dict, estimate: dict, deadline: float, tracer=NULL_TRACER) -> bytes:
+    """
+    Executa o grafo e serializa a resposta uma única vez
+    (o mesmo JSON é devolvido a todas as requisições coalescidas)
+
+    Passado o prazo, a execução é cancelada no próximo bloco de linhas
+    """
+    stats = {}
+    with tracer.span("process_graph"):
+        results = processor.process_graph(
+            payload['nodes'],
+            payload['edges'],
+            outputs=payload['outputs'],
+            memory_budget=payload['memoryBudget'] or DEFAULT_MEMORY_BUDGET,
+            stats=stats,
+            should_cancel=lambda: time.monotonic() > deadline,
+            tracer=tracer,
+            regions=payload['regions'],
+        )
+    stats['cost'] = cost_report(estimate, stats['nodeSeconds'])
+
+    with tracer.span("encode response", cat='http'):
+        return ProcessResponse(results=jsonable_results(results), stats=stats).model_dump_json().encode('utf-8')
+
+@app.get("/images/stats")
+def image_store_stats():
+    return image_store.stats()
+
+@app.get("/cache/stats")
+def node_cache_stats():
+    return node_cache.stats()
+
 @app.post("/process", response_model=ProcessResponse)
-async def process_graph(request: ProcessRequest):
+async def process_graph(
+    request: ProcessRequest,
+    http_request: Request,
+    x_pse_profile: Optional[str] = Header(None),
+):
     """
     Processa o grafo de nós e retorna os resultados
+
+    Perfilamento: `profile` no corpo ou o cabeçalho X-PSE-Profile ("trace" ou
+    "cprofile") grava um trace Chrome/Perfetto em TRACE_DIR (só com
+    PSE_PROFILING=1); o nome do arquivo volta no cabeçalho X-PSE-Trace
     """
+    entered = now_us()
+    try:
+        profile_mode = validate_profile_mode(request.profile or x_pse_profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if profile_mode and not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Perfilamento desativado no servidor (PSE_PROFILING=1)")
+
+    tracer = NULL_TRACER
+    if profile_mode:
+        tracer = Tracer(profile_mode)
+        received_at = getattr(http_request.state, 'received_at', entered)
+        tracer.add_span("receive + validate (pydantic)", received_at, entered, nodes=len(request.nodes))
+
     try:
         # Converter para dicts
-        nodes = [node.model_dump() for node in request.nodes]
-        edges = [edge.model_dump() for edge in request.edges]
+        payload = request.model_dump()
+        key = canonical_graph_key(payload)
 
-        # Processar
-        results = processor.process_graph(nodes, edges)
+        # Estimar o custo antes de executar: grafos caros demais são recusados já aqui
+        with tracer.span("estimate cost", cat='http'):
+            try:
+                estimate = processor.estimate_graph(payload['nodes'], payload['edges'], payload['regions'], payload['outputs'])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Região de interesse inválida: {e}")
+        admission.check(estimate['total'])
 
-        return ProcessResponse(results=results)
+        timeout = payload['timeoutMs'] / 1000 if payload['timeoutMs'] else DEFAULT_REQUEST_TIMEOUT
+        deadline = time.monotonic() + timeout
 
+        run = lambda: admission.run(
+            estimate['total'],
+            lambda: run_in_threadpool(run_graph, payload, estimate, deadline, tracer),
+            deadline
+        )
+
+        # Processar (em thread, para que requisições idênticas possam aguardar juntas);
+        # execuções perfiladas não são coalescidas: o trace é desta requisição
+        body = await (run() if tracer.enabled else process_flight.do(key, run))
+
+        headers = {}
+        if tracer.enabled:
+            tracer.add_span("request", received_at, now_us(), bytes=len(body))
+            headers["X-PSE-Trace"] = await run_in_threadpool(tracer.write, TRACE_DIR, TRACE_MAX_FILES)
+            tracer = NULL_TRACER
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    except HTTPException:
+        raise
+    except GraphRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except GraphCancelled as e:
+        raise HTTPException(status_code=504, detail=f"Tempo limite excedido: {e}")
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Execuções recusadas, canceladas ou com erro também deixam o trace
+        if tracer.enabled:
+            tracer.add_span("request", received_at, now_us(), failed=True)
+            await run_in_threadpool(tracer.write, TRACE_DIR, TRACE_MAX_FILES)
+
+@app.websocket("/ws/session")
+async def editing_session(websocket: WebSocket):
+    """
+    Sessão de edição: o cliente envia deltas do grafo e recebe só as saídas que mudaram
+    """
+    await websocket.accept()
+
+    async def send(message: dict):
+        # Buffers sem cópia (memoryview/bytes) são serializados como listas
+        await websocket.send_text(json.dumps(message, default=list))
+
+    session = EditingSession(processor, send)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                await session.handle(json.loads(text))
+            except (ValueError, ValidationError) as e:
+                await websocket.send_json({"type": "error", "revision": session.revision, "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
 
 @app.post("/upload-raw")
-async def upload_raw_file(file: UploadFile = File(...), width: int = 0, height: int = 0):
+async def upload_raw_file(
+    file: UploadFile = File(...),
+    width: int = 0,
+    height: int = 0,
+    max_width: int = 0,
+    max_height: int = 0,
+):
     """
     Faz upload de um arquivo (RAW ou imagem comum) e retorna os dados em formato RAW
     - Formatos comuns (JPG, PNG, BMP, etc.): dimensões extraídas automaticamente, convertido para escala de cinza
+      - max_width/max_height (opcionais): reduz a resolução já na decodificação
+      - TIFF com várias páginas: cada quadro é gravado e listado em "frames"
     - Formato RAW: requer width e height
     """
     try:
@@ -68,23 +257,39 @@ async def upload_raw_file(file: UploadFile = File(...), width: int = 0, height:
         if file_ext in common_formats:
             # Processar formato de imagem comum
             try:
-                # Abrir imagem com Pillow
-                image = Image.open(io.BytesIO(contents))
-                
-                # Converter para escala de cinza (modo 'L')
-                image = image.convert('L')
-                
-                # Extrair dimensões
-                width, height = image.size
-                
-                # Obter pixels como lista
-                pixel_data = list(image.getdata())
-                
-                return {
-                    "width": width,
-                    "height": height,
-                    "data": pixel_data
+                # Decodificar quadro a quadro direto para buffers uint8 (escala de cinza),
+                # reduzindo já na decodificação se houver max_width/max_height
+                # Cada quadro é gravado assim que decodificado; só os pixels do
+                # primeiro ficam em memória (os demais são lidos por imageId)
+                frames = []
+                first_pixels = None
+                for index, frame in enumerate(decode_image(contents, max_width, max_height)):
+                    frames.append({
+                        "index": index,
+                        "width": frame["width"],
+                        "height": frame["height"],
+                        "imageId": store_image(frame["pixels"], frame["width"], frame["height"]),
+                        "originalWidth": frame["originalWidth"],
+                        "originalHeight": frame["originalHeight"]
+                    })
+                    if index == 0:
+                        first_pixels = frame["pixels"]
+                    del frame
+
+                # O primeiro quadro é devolvido com os pixels; os demais por imageId
+                first = frames[0]
+                response = {
+                    "width": first["width"],
+                    "height": first["height"],
+                    "data": list(first_pixels),
+                    "imageId": first["imageId"],
+                    "originalWidth": first["originalWidth"],
+                    "originalHeight": first["originalHeight"]
                 }
+                if len(frames) > 1:
+                    response["frames"] = frames
+
+                return response
             except Exception as e:
                 raise HTTPException(
                     status_code=400,
@@ -149,7 +354,8 @@ async def upload_raw_file(file: UploadFile = File(...), width: int = 0, height:
                         return {
                             "width": detected_width,
                             "height": detected_height,
-                            "data": pixel_values
+                            "data": pixel_values,
+                            "imageId": store_image(pixel_values, detected_width, detected_height)
                         }
                 except ValueError as e:
                     # Se falhar ao parsear números, processar como RAW binário
@@ -176,7 +382,8 @@ async def upload_raw_file(file: UploadFile = File(...), width: int = 0, height:
             return {
                 "width": width,
                 "height": height,
-                "data": pixel_data
+                "data": pixel_data,
+                "imageId": store_image(contents, width, height)
             }
 
     except HTTPException:
@@ -19,10 +19,22 @@ class Edge(BaseModel):
     sourceHandle: Optional[str] = None
     targetHandle: Optional[str] = None
 
+class Region(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+
 class ProcessRequest(BaseModel):
     nodes: List[Node]
     edges: List[Edge]
+    outputs: Optional[List[str]] = None  # Nós cujo resultado deve ser devolvido (None = todos)
+    memoryBudget: Optional[int] = None  # Limite de bytes vivos durante a execução
+    timeoutMs: Optional[int] = None  # Prazo da requisição; a execução é cancelada ao estourar
+    profile: Optional[str] = None  # "trace" ou "cprofile": grava um trace da execução (ver tracing.py)
+    regions: Optional[Dict[str, Region]] = None  # Região de interesse por nó de saída (ver regions.py)
 
 class ProcessResponse(BaseModel):
     results: Dict[str, Any]
     error: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None  # Métricas da execução (pico de memória, custo estimado × real)
@@ -0,0 +1,133 @@
+"""
+Infraestrutura comum dos filtros de vizinhança (convolução, média, mediana, ordem)
+
+Em vez de testar `if yy < 0 or yy >= height` a cada elemento da janela, a
+imagem é preenchida (padding) UMA vez com `radius` pixels em cada lado. Assim
+o laço interno percorre deslocamentos fixos, sem nenhum teste de borda:
+
+    centro = (y + r) * largura_preenchida + (x + r)
+    vizinho(ky, kx) = buffer[centro + ky * largura_preenchida + kx]
+
+Modos de borda (o que existe "fora" da imagem):
+- zero:      pixels fora valem 0
+- replicate: repete o pixel da borda          (... a a | a b c d | d d ...)
+- reflect:   espelha sem repetir a borda      (... c b | a b c d | c b ...)
+- wrap:      a imagem se repete (periódica)   (... c d | a b c d | a b ...)
+
+Sem modo (None), os filtros que calculam estatísticas da janela (média,
+mediana) usam só os pixels válidos: o interior continua sem testes e apenas
+uma faixa de `radius` pixels na borda passa pelo caminho com verificação.
+"""
+from typing import Any, Iterator, List, Optional, Tuple
+
+BORDER_MODES = ('zero', 'replicate', 'reflect', 'wrap')
+
+
+def validate_border_mode(mode: Optional[str]) -> Optional[str]:
+    if mode is not None and mode not in BORDER_MODES:
+        raise ValueError(f"Modo de borda desconhecido: {mode} (use {', '.join(BORDER_MODES)})")
+    return mode
+
+
+def border_index(i: int, n: int, mode: str) -> int:
+    """
+    Converte um índice possivelmente fora de [0, n) para o índice de origem
+    Retorna -1 quando o pixel vale zero (modo 'zero')
+    """
+    if 0 <= i < n:
+        return i
+    if mode == 'zero':
+        return -1
+    if mode == 'replicate':
+        return 0 if i < 0 else n - 1
+    if mode == 'wrap':
+        return i % n
+    if mode == 'reflect':
+        if n == 1:
+            return 0
+        period = 2 * (n - 1)  # Espelhamentos sucessivos para janelas maiores que a imagem
+        i = i % period
+        return i if i < n else period - i
+    raise ValueError(f"Modo de borda desconhecido: {mode}")
+
+
+def pad_line(line: Any, radius: int, mode: str) -> List[int]:
+    """
+    Preenche uma linha (ou coluna) com `radius` valores de cada lado
+    """
+    length = len(line)
+    left = [line[j] if j >= 0 else 0 for j in (border_index(i, length, mode) for i in range(-radius, 0))]
+    right = [line[j] if j >= 0 else 0 for j in (border_index(i, length, mode) for i in range(length, length + radius))]
+    return left + list(line) + right
+
+
+def pad_image(pixels: Any, width: int, height: int, radius: int, mode: str) -> Tuple[List[int], int]:
+    """
+    Preenche a imagem com `radius` pixels em cada lado segundo o modo de borda
+    Retorna (buffer preenchido, largura preenchida)
+    """
+    padded_width = width + 2 * radius
+    zero_row = [0] * padded_width
+    padded: List[int] = []
+
+    for y in range(-radius, height + radius):
+        source_y = border_index(y, height, mode)
+        if source_y < 0:
+            padded.extend(zero_row)
+        else:
+            start = source_y * width
+            padded.extend(pad_line(pixels[start:start + width], radius, mode))
+
+    return padded, padded_width
+
+
+def window_offsets(radius: int, stride: int) -> List[int]:
+    """
+    Deslocamentos (no buffer linear) de todos os pixels da janela em relação ao centro
+    """
+    return [
+        ky * stride + kx
+        for ky in range(-radius, radius + 1)
+        for kx in range(-radius, radius + 1)
+    ]
+
+
+def kernel_taps(kernel: List[List[float]], radius: int, stride: int) -> List[Tuple[int, float]]:
+    """
+    Pares (deslocamento, peso) do kernel, descartando pesos zero
+    (ex: o Laplaciano 3×3 só tem 5 termos não nulos)
+    """
+    taps = []
+    for ky in range(-radius, radius + 1):
+        for kx in range(-radius, radius + 1):
+            weight = kernel[ky + radius][kx + radius]
+            if weight != 0:
+                taps.append((ky * stride + kx, weight))
+    return taps
+
+
+def edge_coordinates(width: int, height: int, radius: int) -> Iterator[Tuple[int, int]]:
+    """
+    Pixels cuja janela sai da imagem (faixa de `radius` pixels em volta do interior)
+    """
+    for y in range(height):
+        if y < radius or y >= height - radius:
+            for x in range(width):
+                yield x, y
+        else:
+            for x in range(min(radius, width)):
+                yield x, y
+            for x in range(max(radius, width - radius), width):
+                yield x, y
+
+
+def valid_window(pixels: Any, width: int, height: int, x: int, y: int, radius: int) -> List[int]:
+    """
+    Caminho de borda: coleta só os pixels da janela que estão dentro da imagem
+    """
+    window = []
+    for yy in range(max(0, y - radius), min(height, y + radius + 1)):
+        row = yy * width
+        for xx in range(max(0, x - radius), min(width, x + radius + 1)):
+            window.append(pixels[row + xx])
+    return window
@@ -0,0 +1,342 @@
+"""
+Cache de saídas de nós endereçado por conteúdo, em duas camadas
+
+1. Memória: LRU pequeno por processo, com pixels compactos (bytes, 1 por pixel)
+2. Disco: arquivos que sobrevivem a deploys/quedas, lidos via mmap, com
+   despejo LRU pelo total de bytes e escrita atômica (arquivo temporário + os.replace)
+
+A chave de um nó é o hash de: versão do código + tipo + parâmetros + chaves
+das entradas (+ região de interesse, quando o nó calcula só um recorte). Assim, mudar um parâmetro (ou qualquer nó acima) gera outra
+chave, e mudar o código do processador muda a versão: entradas antigas ficam
+em outro diretório e são removidas na inicialização.
+
+Formato do arquivo de uma entrada:
+- 4 bytes (big-endian) com o tamanho do cabeçalho
+- cabeçalho JSON (campos do resultado, exceto os pixels)
+- pixels uint8
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+# Campos de node['data'] que só importam para a interface
+UI_ONLY_DATA_FIELDS = ('label',)
+
+# Tipos de nó puros cujo resultado é uma imagem uint8 (os únicos guardados)
+CACHEABLE_NODE_TYPES = ('CONVOLUTION', 'POINT_OP', 'DIFFERENCE')
+
+HEADER_SIZE = struct.Struct('>I')
+
+
+def source_version(paths: Iterable[str]) -> str:
+    """
+    Versão do código: hash do conteúdo dos arquivos-fonte do processamento
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def pixels_key(pixels: Any, width: int, height: int) -> Optional[str]:
+    """
+    Chave de uma imagem de entrada a partir do seu conteúdo
+    """
+    try:
+        content = bytes(pixels)
+    except (TypeError, ValueError):  # Valores fora de 0-255
+        return None
+    return hashlib.sha256(f"{width}x{height}:".encode() + content).hexdigest()
+
+
+def node_key(version: str, node: Dict, input_keys: List[str], region: Optional[tuple] = None) -> str:
+    """
+    Chave de um nó: versão do código + tipo + parâmetros + chaves das entradas
+    (+ retângulo calculado, se for só um recorte do quadro)
+    """
+    params = {
+        key: value for key, value in node.get('data', {}).items()
+        if key not in UI_ONLY_DATA_FIELDS
+    }
+    parts = [version, node['type'], params, input_keys]
+    if region is not None:
+        parts.append(list(region))
+    encoded = json.dumps(
+        parts,
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(result: Any) -> bool:
+    return (
+        isinstance(result, dict)
+        and result.get('type') == 'image'
+        and 'error' not in result
+        and result.get('data') is not None
+    )
+
+
+class MemoryLayer:
+    """
+    LRU em memória limitado pelo total de bytes dos pixels
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, result: Dict) -> int:
+        """
+        Guarda o resultado e retorna quantas entradas foram despejadas
+        """
+        if key in self._entries or len(result['data']) > self.max_bytes:
+            return 0
+
+        self._entries[key] = result
+        self.total_bytes += len(result['data'])
+
+        evicted = 0
+        while self.total_bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.total_bytes -= len(old['data'])
+            evicted += 1
+        return evicted
+
+
+class DiskLayer:
+    """
+    Entradas em disco lidas via mmap, com despejo LRU pelo total de bytes
+
+    O "uso recente" é o mtime do arquivo, atualizado a cada acerto: assim
+    vários workers compartilham a mesma noção de LRU
+    """
+
+    def __init__(self, root: str, version: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(root, version)
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale_versions(version)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _remove_stale_versions(self, version: str) -> None:
+        """
+        Remove diretórios de versões antigas do código
+
+        O diretório é primeiro renomeado (operação atômica) e só depois
+        apagado: nenhum worker encontra uma versão antiga pela metade, e
+        arquivos já mapeados continuam válidos após a remoção
+        """
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name == version or not os.path.isdir(path):
+                continue
+            trash = os.path.join(self.root, f".trash-{uuid.uuid4().hex}")
+            try:
+                if not name.startswith('.trash-'):
+                    os.rename(path, trash)
+                    path = trash
+                shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass  # Outro worker já removeu
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _scan(self) -> List[tuple]:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Lê a entrada; arquivos truncados ou corrompidos (ex: queda durante a
+        gravação) contam como falha e são removidos
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: arquivo vazio
+            if os.path.exists(path):
+                self._discard(path)
+            return None
+
+        view = memoryview(mapped)
+        try:
+            (header_size,) = HEADER_SIZE.unpack(view[:HEADER_SIZE.size])
+            header_end = HEADER_SIZE.size + header_size
+            if header_end > len(view):
+                raise ValueError("cabeçalho maior que o arquivo")
+            result = json.loads(bytes(view[HEADER_SIZE.size:header_end]))
+            if not isinstance(result, dict):
+                raise ValueError("cabeçalho não é um objeto")
+        except (struct.error, ValueError, UnicodeDecodeError):  # JSONDecodeError é ValueError
+            self._discard(path)
+            return None
+
+        try:
+            os.utime(path)  # Marca como usado recentemente (só entradas válidas)
+        except FileNotFoundError:
+            pass
+        result['data'] = view[header_end:]
+        return result
+
+    def _discard(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.total_bytes = max(0, self.total_bytes - size)
+        except FileNotFoundError:
+            pass
+
+    def put(self, key: str, result: Dict) -> int:
+        """
+        Grava a entrada atomicamente e retorna quantas entradas foram despejadas
+        """
+        path = self._path(key)
+        if os.path.exists(path):
+            return 0
+
+        header = json.dumps({k: v for k, v in result.items() if k != 'data'}).encode('utf-8')
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER_SIZE.pack(len(header)))
+                f.write(header)
+                f.write(result['data'])
+                # Dados no disco antes da troca: uma queda não deixa uma entrada pela metade
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except OSError:
+            return 0  # Diretório removido por um worker de versão mais nova, disco cheio...
+
+        self.total_bytes += HEADER_SIZE.size + len(header) + len(result['data'])
+        if self.total_bytes <= self.max_bytes:
+            return 0
+        return self._evict()
+
+    def _evict(self) -> int:
+        """
+        Remove as entradas menos usadas até caber no limite
+        (reescaneia o diretório, pois outros workers também gravam)
+        """
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            evicted += 1
+        return evicted
+
+
+class NodeCache:
+    """
+    Cache de duas camadas: memória primeiro, depois disco
+    """
+
+    def __init__(
+        self,
+        version: str,
+        disk_root: Optional[str] = None,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.version = version
+        self.memory = MemoryLayer(memory_max_bytes)
+        self.disk = DiskLayer(disk_root, version, disk_max_bytes) if disk_root else None
+        self._lock = threading.Lock()  # Grafos diferentes rodam em threads concorrentes
+        self.counters = {
+            "memoryHits": 0,
+            "diskHits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memoryEvictions": 0,
+            "diskEvictions": 0
+        }
+
+    def key(self, node: Dict, input_keys: List[str], region: Optional[tuple] = None) -> str:
+        return node_key(self.version, node, input_keys, region)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Retorna uma cópia rasa do resultado (o chamador pode alterar o dict)
+        """
+        with self._lock:
+            result = self.memory.get(key)
+            if result is not None:
+                self.counters["memoryHits"] += 1
+                return dict(result)
+
+        if self.disk is not None:
+            result = self.disk.get(key)
+            if result is not None:
+                with self._lock:
+                    self.counters["diskHits"] += 1
+                    self.memory.put(key, dict(result, data=bytes(result['data'])))
+                return result
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, result: Dict) -> None:
+        if not is_cacheable(result):
+            return
+
+        try:
+            compact = dict(result, data=bytes(result['data']))  # 1 byte por pixel
+        except (TypeError, ValueError):
+            return
+
+        with self._lock:
+            self.counters["stores"] += 1
+            self.counters["memoryEvictions"] += self.memory.put(key, compact)
+        if self.disk is not None:
+            evicted = self.disk.put(key, compact)
+            with self._lock:
+                self.counters["diskEvictions"] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            **self.counters,
+            "memoryEntries": len(self.memory),
+            "memoryBytes": self.memory.total_bytes,
+            "diskBytes": self.disk.total_bytes if self.disk is not None else 0,
+            "diskDirectory": self.disk.directory if self.disk is not None else None
+        }
@@ -1,53 +1,355 @@
 import math
-from typing import List, Dict, Any, Optional
+import sys
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional
 from collections import deque
+from node_cache import CACHEABLE_NODE_TYPES, pixels_key, source_version
+from cost import estimate_graph
+from regions import crop_input, crop_output, plan_regions, propagate_sizes
+from tracing import NULL_TRACER
+from neighborhood import (
+    edge_coordinates,
+    kernel_taps,
+    pad_image,
+    pad_line,
+    valid_window,
+    validate_border_mode,
+    window_offsets,
+)
+import neighborhood
+import regions as regions_module
+
+# Filtros de ordem (morfologia em tons de cinza) e a sequência de passadas de cada um
+# True = mínimo (erosão), False = máximo (dilatação)
+RANK_FILTER_TYPES = {
+    'minimo': (True,),
+    'maximo': (False,),
+    'abertura': (True, False),  # Erosão seguida de dilatação
+    'fechamento': (False, True),  # Dilatação seguida de erosão
+}
+
+# Linhas processadas entre verificações de cancelamento dentro de um filtro
+TILE_ROWS = 16
+
+# Versão do código de processamento: invalida o cache de nós quando muda
+CODE_VERSION = source_version([__file__, neighborhood.__file__, regions_module.__file__])
+
+
+class GraphCancelled(Exception):
+    """
+    Lançada quando a execução é cancelada (ex: chegou uma edição mais nova)
+    """
+
+
+class MemoryBudgetExceeded(Exception):
+    """
+    Lançada quando os buffers vivos de uma execução ultrapassam o orçamento
+    """
+
+
+def buffer_nbytes(data: Any) -> int:
+    """
+    Estima quantos bytes um buffer de pixels ocupa em memória
+    """
+    if isinstance(data, memoryview):
+        return data.nbytes
+    return sys.getsizeof(data)
+
+
+class MemoryTracker:
+    """
+    Contabiliza os bytes dos buffers vivos durante uma execução do grafo
+
+    Nós como DISPLAY repassam o mesmo buffer da entrada, por isso a
+    contagem é feita por buffer (id do objeto) e não por resultado
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self._buffer_refs: Dict[int, int] = {}  # id(buffer) -> resultados que o usam
+        self._buffer_sizes: Dict[int, int] = {}  # id(buffer) -> bytes
+        self._owned: Dict[str, int] = {}  # node_id -> id(buffer)
+
+    def retain(self, node_id: str, result: Dict) -> None:
+        data = result.get('data') if isinstance(result, dict) else None
+        if data is None:
+            return
+
+        key = id(data)
+        self._owned[node_id] = key
+        if key in self._buffer_refs:
+            self._buffer_refs[key] += 1
+            return
+
+        size = buffer_nbytes(data)
+        self._buffer_refs[key] = 1
+        self._buffer_sizes[key] = size
+        self.live_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+
+        if self.budget is not None and self.live_bytes > self.budget:
+            raise MemoryBudgetExceeded(
+                f"Orçamento de memória excedido no nó {node_id}: "
+                f"{self.live_bytes} bytes vivos, limite {self.budget} bytes"
+            )
+
+    def release(self, node_id: str) -> None:
+        key = self._owned.pop(node_id, None)
+        if key is None:
+            return
+
+        self._buffer_refs[key] -= 1
+        if self._buffer_refs[key] == 0:
+            del self._buffer_refs[key]
+            self.live_bytes -= self._buffer_sizes.pop(key)
+
 
 class ImageProcessor:
 
+    def __init__(self, image_store: Optional[Any] = None, cache: Optional[Any] = None):
+        # Armazenamento compartilhado entre workers (imagens referenciadas por imageId)
+        self.image_store = image_store
+        # Cache de saídas de nós (memória + disco), consultado antes de processar
+        self.cache = cache
+        # Verificação de cancelamento da execução corrente (uma por thread)
+        self._local = threading.local()
 
-    def process_graph(self, nodes: List[Dict], edges: List[Dict]) -> Dict[str, Any]:
+    def process_graph(
+        self,
+        nodes: List[Dict],
+        edges: List[Dict],
+        outputs: Optional[List[str]] = None,
+        memory_budget: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        reuse: Optional[Dict[str, Any]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        tracer: Any = None,
+        regions: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> Dict[str, Any]:
         """
         Processa o grafo de nós executando em ordem topológica
         Garante que dependências sejam processadas antes de seus dependentes
+
+        Tempo de vida dos intermediários:
+        - Cada nó conta quantas arestas consomem sua saída (referências)
+        - Quando o último consumidor roda, a saída é liberada, a menos que
+          o nó esteja em `outputs` (None = todos os nós são saídas)
+        - `memory_budget` (bytes) limita a memória viva dos buffers; se for
+          excedido, lança MemoryBudgetExceeded
+        - Se `stats` for informado, recebe o pico de bytes residentes
+          e os nós servidos pelo cache
+
+        Execução incremental:
+        - `reuse` traz resultados de uma execução anterior para nós que não
+          mudaram; esses nós não são reprocessados
+        - `should_cancel` é consultado entre nós e entre blocos de linhas
+          dentro dos filtros (ex: prazo estourado); se retornar True, lança GraphCancelled
+        - `stats['nodeSeconds']` recebe o tempo real de cada nó (calibração do modelo de custo)
+
+        Perfilamento: `tracer` (ver tracing.py) registra spans da compilação do
+        grafo e de cada nó (entradas, cache, cálculo); sem ele, usa o NULL_TRACER
+
+        Região de interesse: `regions` ({nó: {x, y, width, height}}) limita o
+        cálculo ao recorte pedido de cada saída e ao halo dos filtros acima
+        dela (ver regions.py); `stats['regions']` traz o plano de recortes
         """
+        tracer = tracer or NULL_TRACER
         nodes_dict = {node['id']: node for node in nodes}
 
-        try:
-            sorted_node_ids = self.topological_sort(nodes_dict, edges)
-        except Exception as e:
-            return {"error": f"Erro na ordenação topológica: {str(e)}"}
+        with tracer.span("compile", nodes=len(nodes), edges=len(edges)):
+            try:
+                sorted_node_ids = self.topological_sort(nodes_dict, edges)
+            except Exception as e:
+                return {"error": f"Erro na ordenação topológica: {str(e)}"}
+
+            # Referências pendentes: quantas arestas ainda vão ler a saída de cada nó
+            pending_consumers = {node_id: 0 for node_id in nodes_dict}
+            for edge in edges:
+                pending_consumers[edge['source']] += 1
+            keep = set(nodes_dict) if outputs is None else set(outputs)
+
+            # Plano de recortes: dimensões propagadas dos nós de leitura, de trás para frente
+            plan = {}
+            if regions:
+                sizes = propagate_sizes(nodes, edges, self.get_reader_size)
+                try:
+                    plan = plan_regions(nodes_dict, edges, sorted_node_ids, sizes, regions, outputs)
+                except ValueError as e:
+                    return {"error": f"Região de interesse inválida: {str(e)}"}
 
         # Cache de resultados: permite que nós acessem outputs de nós anteriores
         results = {}
+        memory = MemoryTracker(memory_budget)
+        node_keys = {}  # Chave de conteúdo de cada nó (entradas + parâmetros)
+        cached_nodes = []
 
-        for node_id in sorted_node_ids:
-            node = nodes_dict[node_id]
-            node_type = node['type']
+        node_seconds = {}
 
-            inputs = self.get_node_inputs(node_id, edges, results)
+        # Filtros consultam o cancelamento entre blocos de linhas (ver check_cancelled)
+        self._local.should_cancel = should_cancel
+        try:
+            for node_id in sorted_node_ids:
+                self.check_cancelled(f"antes do nó {node_id}")
 
-            try:
-                if node_type == 'RAW_READER':
-                    results[node_id] = self.process_raw_reader(node, inputs)
-                elif node_type == 'CONVOLUTION':
-                    results[node_id] = self.process_convolution(node, inputs)
-                elif node_type == 'POINT_OP':
-                    results[node_id] = self.process_point_operation(node, inputs)
-                elif node_type == 'DISPLAY':
-                    results[node_id] = self.process_display(node, inputs)
-                elif node_type == 'SAVE':
-                    results[node_id] = self.process_save(node, inputs)
-                elif node_type == 'HISTOGRAM':
-                    results[node_id] = self.process_histogram(node, inputs)
-                elif node_type == 'DIFFERENCE':
-                    results[node_id] = self.process_difference(node, inputs)
-                else:
-                    results[node_id] = {"error": f"Tipo de nó desconhecido: {node_type}"}
-            except Exception as e:
-                results[node_id] = {"error": f"Erro ao processar nó {node_id}: {str(e)}"}
+                node = nodes_dict[node_id]
+
+                with tracer.node(node_id, node['type']) as node_span:
+                    with tracer.span("inputs"):
+                        inputs = self.get_node_inputs(node_id, edges, results)
+
+                    reused = reuse is not None and node_id in reuse
+                    cached = None
+                    if self.cache is not None:
+                        with tracer.span("cache lookup"):
+                            region = plan[node_id][0] if node_id in plan else None
+                            node_keys[node_id] = self.get_node_key(node, edges, node_keys, region)
+                            if not reused and node_keys[node_id] and node['type'] in CACHEABLE_NODE_TYPES:
+                                cached = self.cache.get(node_keys[node_id])
+
+                    started = time.perf_counter()
+                    if reused:
+                        results[node_id] = reuse[node_id]
+                        node_span.set(source="reuse")
+                    elif cached is not None:
+                        results[node_id] = cached
+                        cached_nodes.append(node_id)
+                        node_span.set(source="cache")
+                    else:
+                        with tracer.span("compute"):
+                            if node_id in plan:
+                                results[node_id] = self.process_node_region(node, inputs, *plan[node_id], sizes[node_id])
+                            else:
+                                results[node_id] = self.process_node(node, inputs)
+                        if node_keys.get(node_id) and node['type'] in CACHEABLE_NODE_TYPES:
+                            with tracer.span("cache store"):
+                                self.cache.put(node_keys[node_id], results[node_id])
+                    if not reused:
+                        node_seconds[node_id] = time.perf_counter() - started
+                    memory.retain(node_id, results[node_id])
+
+                # Libera entradas cujo último consumidor acabou de rodar
+                released = [node_id] if pending_consumers[node_id] == 0 else []
+                for edge in edges:
+                    if edge['target'] == node_id:
+                        source_id = edge['source']
+                        pending_consumers[source_id] -= 1
+                        if pending_consumers[source_id] == 0:
+                            released.append(source_id)
+                for released_id in released:
+                    if released_id not in keep and released_id in results:
+                        del results[released_id]
+                        memory.release(released_id)
+        finally:
+            self._local.should_cancel = None
+
+        if stats is not None:
+            stats['peakResidentBytes'] = memory.peak_bytes
+            stats['memoryBudget'] = memory_budget
+            stats['cachedNodes'] = cached_nodes
+            stats['nodeSeconds'] = node_seconds
+            if regions:
+                stats['regions'] = {
+                    node_id: {"output": list(output), "window": list(window)}
+                    for node_id, (output, window) in plan.items()
+                }
 
         return results
 
+    def process_node(self, node: Dict, inputs: List) -> Dict:
+        """
+        Despacha um nó para o processamento correspondente ao seu tipo
+        """
+        node_id = node['id']
+        node_type = node['type']
+
+        try:
+            if node_type == 'RAW_READER':
+                return self.process_raw_reader(node, inputs)
+            elif node_type == 'CONVOLUTION':
+                return self.process_convolution(node, inputs)
+            elif node_type == 'POINT_OP':
+                return self.process_point_operation(node, inputs)
+            elif node_type == 'DISPLAY':
+                return self.process_display(node, inputs)
+            elif node_type == 'SAVE':
+                return self.process_save(node, inputs)
+            elif node_type == 'HISTOGRAM':
+                return self.process_histogram(node, inputs)
+            elif node_type == 'DIFFERENCE':
+                return self.process_difference(node, inputs)
+            else:
+                return {"error": f"Tipo de nó desconhecido: {node_type}"}
+        except GraphCancelled:
+            raise  # Cancelamento interrompe o grafo inteiro, não vira erro do nó
+        except Exception as e:
+            return {"error": f"Erro ao processar nó {node_id}: {str(e)}"}
+
+    def process_node_region(self, node: Dict, inputs: List, output: tuple, window: tuple, frame: tuple) -> Dict:
+        """
+        Processa só um recorte do nó (ver regions.py)
+        - as entradas são recortadas na janela (saída + halo) e o nó roda
+          normalmente sobre esse recorte
+        - o resultado é reduzido ao retângulo de saída e marcado com `region`
+        """
+        try:
+            inputs = [crop_input(input_result, window) for input_result in inputs]
+        except ValueError as e:
+            return {"error": f"Erro no nó {node['id']}: {str(e)}"}
+
+        result = self.process_node(node, inputs)
+
+        # Leitura não tem entradas: devolve o quadro inteiro
+        origin = window if inputs else (0, 0) + tuple(frame)
+        return crop_output(result, origin, output, frame)
+
+    def check_cancelled(self, where: str = "") -> None:
+        """
+        Ponto de cancelamento cooperativo: entre nós e entre blocos de linhas
+        (TILE_ROWS) dentro dos filtros
+        """
+        should_cancel = getattr(self._local, 'should_cancel', None)
+        if should_cancel is not None and should_cancel():
+            raise GraphCancelled(f"Execução cancelada {where}".strip())
+
+    def estimate_graph(
+        self,
+        nodes: List[Dict],
+        edges: List[Dict],
+        regions: Optional[Dict[str, Dict[str, int]]] = None,
+        outputs: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Estima o custo do grafo antes de executar (ver cost.py)
+        Com região de interesse, cada nó conta só a janela que vai processar
+        (lança ValueError se uma região cair fora da imagem)
+        """
+        sizes = propagate_sizes(nodes, edges, self.get_reader_size)
+        if regions:
+            nodes_dict = {node['id']: node for node in nodes}
+            try:
+                sorted_node_ids = self.topological_sort(nodes_dict, edges)
+            except Exception:
+                sorted_node_ids = None  # Grafo com ciclo: o erro aparece na execução
+            # Região fora da imagem: ValueError
+            plan = plan_regions(nodes_dict, edges, sorted_node_ids, sizes, regions, outputs) if sorted_node_ids else {}
+            for node_id, (output, window) in plan.items():
+                sizes[node_id] = window[2:] if nodes_dict[node_id]['type'] != 'RAW_READER' else output[2:]
+        return estimate_graph(nodes, sizes)
+
+    def get_reader_size(self, node: Dict) -> tuple:
+        """
+        Dimensões de um nó de leitura (do armazenamento, se houver imageId)
+        """
+        data = node.get('data', {})
+        if data.get('imageId') and self.image_store is not None:
+            stored = self.image_store.get(data['imageId'])
+            if stored is not None:
+                return stored['width'], stored['height']
+        return data.get('width', 0) or 0, data.get('height', 0) or 0
+
     def topological_sort(self, nodes: Dict[str, Any], edges: List[Dict]) -> List[str]:
         """
         Algoritmo de Kahn: ordena nós de forma que dependências sejam processadas antes
@@ -82,6 +384,35 @@ class ImageProcessor:
 
         return sorted_nodes
 
+    def get_node_key(
+        self,
+        node: Dict,
+        edges: List[Dict],
+        node_keys: Dict[str, Optional[str]],
+        region: Optional[tuple] = None,
+    ) -> Optional[str]:
+        """
+        Chave de conteúdo do nó para o cache
+        - Leitura: hash da imagem (o imageId já é o hash do conteúdo)
+        - Demais: parâmetros do nó + chaves das entradas, na ordem das arestas
+          (+ o retângulo calculado, se o nó só calcula um recorte)
+        """
+        if node['type'] == 'RAW_READER':
+            data = node.get('data', {})
+            if data.get('imageId'):
+                return f"image:{data['imageId']}"
+            return pixels_key(data.get('imageData', []), data.get('width', 0), data.get('height', 0))
+
+        input_keys = []
+        for edge in edges:
+            if edge['target'] == node['id']:
+                source_key = node_keys.get(edge['source'])
+                if source_key is None:
+                    return None  # Entrada sem chave: o nó não é cacheável
+                input_keys.append(source_key)
+
+        return self.cache.key(node, input_keys, region)
+
     def get_node_inputs(self, node_id: str, edges: List[Dict], results: Dict) -> List[Any]:
         """
         Obtém as entradas (outputs de nós anteriores) para um nó específico
@@ -99,9 +430,19 @@ class ImageProcessor:
     def process_raw_reader(self, node: Dict, inputs: List) -> Dict:
         """
         Processa o bloco de leitura RAW
-        Os dados já vêm do frontend
+        Os dados vêm do frontend (imageData) ou do armazenamento compartilhado (imageId)
         """
         data = node.get('data', {})
+
+        # Imagem enviada anteriormente (possivelmente a outro worker): lida sem cópia
+        image_id = data.get('imageId')
+        if image_id and self.image_store is not None:
+            stored = self.image_store.get(image_id)
+            if stored is not None:
+                return {"type": "image", **stored}
+            if not data.get('imageData'):
+                return {"error": f"Imagem {image_id} não encontrada no armazenamento"}
+
         return {
             "type": "image",
             "width": data.get('width', 0),
@@ -129,47 +470,34 @@ class ImageProcessor:
         kernel_size = params.get('kernelSize', 3)  # Tamanho da janela (3x3, 5x5, etc)
         filter_type = params.get('filterType', 'convolution')  # Tipo de filtro
         
+        # Modo de borda (padrão: zero para convolução/laplaciano, só pixels válidos para média/mediana/ordem)
+        border_mode = validate_border_mode(params.get('borderMode'))
+
         # Redireciona para filtros especializados
         if filter_type == 'mediana':
-            return self.process_median(pixels, width, height, kernel_size)
+            return self.process_median(pixels, width, height, kernel_size, border_mode)
         
         if filter_type == 'laplacian':
-            return self.process_laplacian(pixels, width, height)
+            return self.process_laplacian(pixels, width, height, border_mode)
         
         if filter_type == 'media':
-            return self.process_mean(pixels, width, height, kernel_size)
+            return self.process_mean(pixels, width, height, kernel_size, border_mode)
+
+        if filter_type in RANK_FILTER_TYPES:
+            return self.process_rank_filter(pixels, width, height, kernel_size, filter_type, border_mode)
         
         # Convolução com kernel customizado
         kernel = params.get('kernel', [[1, 1, 1], [1, 1, 1], [1, 1, 1]])
         divisor = params.get('divisor', 9)  # Normalização (soma dos pesos do kernel)
-
-        output = [0] * (width * height)  # Imagem de saída
         radius = (kernel_size - 1) // 2  # Raio da janela (ex: 3x3 tem raio 1)
 
-        # Percorre cada pixel da imagem
-        for y in range(height):
-            for x in range(width):
-                accumulator = 0  # Acumula resultado da convolução
-
-                # Percorre a vizinhança do kernel centrado no pixel (x, y)
-                for ky in range(-radius, radius + 1):
-                    yy = y + ky  # Posição Y do vizinho
-                    if yy < 0 or yy >= height:  # Ignora pixels fora da imagem
-                        continue
-
-                    for kx in range(-radius, radius + 1):
-                        xx = x + kx  # Posição X do vizinho
-                        if xx < 0 or xx >= width:  # Ignora pixels fora da imagem
-                            continue
+        # Soma ponderada da vizinhança de cada pixel (ver convolve)
+        output = self.convolve(pixels, width, height, kernel, radius, border_mode or 'zero')
 
-                        # Multiplica peso do kernel pelo valor do pixel
-                        kernel_value = kernel[ky + radius][kx + radius]  # Peso da máscara
-                        pixel_value = pixels[yy * width + xx]  # Valor do pixel vizinho
-                        accumulator += kernel_value * pixel_value  # Soma ponderada
-
-                # Normaliza dividindo pelo divisor e limita resultado entre 0-255
-                result = int(accumulator / divisor) if divisor != 0 else 0
-                output[y * width + x] = max(0, min(255, result))  # Clamp [0, 255]
+        # Normaliza dividindo pelo divisor e limita resultado entre 0-255
+        for i in range(len(output)):
+            result = int(output[i] / divisor) if divisor != 0 else 0
+            output[i] = max(0, min(255, result))  # Clamp [0, 255]
 
         return {
             "type": "image",
@@ -177,7 +505,44 @@ class ImageProcessor:
             "height": height,
             "data": output
         }
+
+    def convolve(self, pixels: List[int], width: int, height: int, kernel: List[List[float]], radius: int, border_mode: str) -> List[float]:
+        """
+        Soma ponderada (sem normalizar) do kernel centrado em cada pixel
+
+        A imagem é preenchida uma única vez segundo o modo de borda; o laço
+        interno percorre só os pesos não nulos do kernel, sem testes de borda
+        """
+        padded, stride = pad_image(pixels, width, height, radius, border_mode)
+        taps = kernel_taps(kernel, radius, stride)  # (deslocamento, peso) dos vizinhos
+
+        output = [0] * (width * height)  # Imagem de saída
+        for y in range(height):
+            if y % TILE_ROWS == 0:
+                self.check_cancelled("durante a convolução")
+            row = (y + radius) * stride + radius  # Posição de (0, y) no buffer preenchido
+            for x in range(width):
+                center = row + x
+                accumulator = 0  # Acumula resultado da convolução
+                for offset, weight in taps:
+                    accumulator += weight * padded[center + offset]  # Soma ponderada
+                output[y * width + x] = accumulator
+
+        return output
     
+    def window_source(self, pixels: List[int], width: int, height: int, radius: int, border_mode: Optional[str]):
+        """
+        Prepara o buffer percorrido pelos filtros de janela
+        - Com border_mode: imagem preenchida uma vez; todos os pixels são "interior"
+        - Sem border_mode: imagem original; interior = pixels cuja janela cabe
+          inteira na imagem (a faixa da borda fica para o caminho com verificação)
+        Retorna (buffer, largura do buffer, faixa de x, faixa de y)
+        """
+        if border_mode:
+            padded, stride = pad_image(pixels, width, height, radius, border_mode)
+            return padded, stride, range(width), range(height)
+        return pixels, width, range(radius, width - radius), range(radius, height - radius)
+
     def insertion_sort(self, arr: List[int]) -> List[int]:
         """
         Implementação manual de insertion sort para ordenar pixels
@@ -211,7 +576,7 @@ class ImageProcessor:
         
         return sorted_arr
     
-    def process_median(self, pixels: List[int], width: int, height: int, window_size: int) -> Dict:
+    def process_median(self, pixels: List[int], width: int, height: int, window_size: int, border_mode: Optional[str] = None) -> Dict:
         """
         ═══════════════════════════════════════════════════════════════
         FILTRO DE MEDIANA - Remove ruído sal-e-pimenta
@@ -241,39 +606,37 @@ class ImageProcessor:
         DIFERENÇA DA MÉDIA:
         - Média: soma tudo e divide (ruído afeta muito)
         - Mediana: pega o do meio (ruído é ignorado)
+
+        BORDAS:
+        - Sem border_mode: usa só os pixels dentro da imagem (janela menor na borda)
+        - Com border_mode: a imagem é preenchida e toda janela tem k×k pixels
         ═══════════════════════════════════════════════════════════════
         """
         output = [0] * (width * height)  # Imagem de saída
         radius = (window_size - 1) // 2  # Raio da janela (ex: 3x3 tem raio 1)
-        
-        # Percorre cada pixel da imagem
-        for y in range(height):
-            for x in range(width):
-                window_pixels = []  # Lista para coletar pixels da vizinhança
-                
-                # PASSO 1: Coleta todos os pixels válidos dentro da janela
-                for ky in range(-radius, radius + 1):
-                    yy = y + ky  # Posição Y do vizinho
-                    if yy < 0 or yy >= height:  # Ignora pixels fora da imagem
-                        continue
-                    
-                    for kx in range(-radius, radius + 1):
-                        xx = x + kx  # Posição X do vizinho
-                        if xx < 0 or xx >= width:  # Ignora pixels fora da imagem
-                            continue
-                        
-                        # Adiciona o pixel à lista
-                        window_pixels.append(pixels[yy * width + xx])
-                
-                # PASSO 2: Ordena os pixels coletados
+
+        # PASSO 1 (interior): janela coletada por deslocamentos fixos, sem testes de borda
+        buffer, stride, x_range, y_range = self.window_source(pixels, width, height, radius, border_mode)
+        offsets = window_offsets(radius, stride)
+        pad = radius if border_mode else 0
+
+        for y in y_range:
+            if y % TILE_ROWS == 0:
+                self.check_cancelled("durante a mediana")
+            row = (y + pad) * stride + pad
+            for x in x_range:
+                center = row + x
+                window_pixels = [buffer[center + offset] for offset in offsets]
+
+                # PASSO 2 e 3: ordena e pega o valor do meio
                 sorted_pixels = self.insertion_sort(window_pixels)
-                
-                # PASSO 3: Pega o valor do meio (mediana)
-                median_index = len(sorted_pixels) // 2
-                median_value = sorted_pixels[median_index]
-                
-                # PASSO 4: Atribui a mediana ao pixel de saída
-                output[y * width + x] = median_value
+                output[y * width + x] = sorted_pixels[len(sorted_pixels) // 2]
+
+        # PASSO 1 (borda, só sem border_mode): coleta apenas pixels válidos
+        if not border_mode:
+            for x, y in edge_coordinates(width, height, radius):
+                sorted_pixels = self.insertion_sort(valid_window(pixels, width, height, x, y, radius))
+                output[y * width + x] = sorted_pixels[len(sorted_pixels) // 2]
         
         # Cria a máscara/janela para visualização (todos os valores são 1)
         # Representa a região de onde os pixels são coletados
@@ -288,7 +651,7 @@ class ImageProcessor:
             "maskSize": window_size  # Tamanho da janela (ex: 3, 5, 7)
         }
     
-    def process_laplacian(self, pixels: List[int], width: int, height: int) -> Dict:
+    def process_laplacian(self, pixels: List[int], width: int, height: int, border_mode: Optional[str] = None) -> Dict:
         """
         ═══════════════════════════════════════════════════════════════
         FILTRO LAPLACIANO - Detecta bordas
@@ -338,34 +701,15 @@ class ImageProcessor:
             [ 0, -1,  0]   # Linha inferior
         ]
         
-        output = [0] * (width * height)  # Imagem de saída
         radius = 1  # Kernel 3x3 tem raio 1
-        
-        # Percorre cada pixel da imagem
-        for y in range(height):
-            for x in range(width):
-                accumulator = 0  # Acumula resultado da convolução
-                
-                # Aplica o kernel Laplaciano na vizinhança
-                for ky in range(-radius, radius + 1):
-                    yy = y + ky  # Posição Y do vizinho
-                    if yy < 0 or yy >= height:  # Ignora pixels fora da imagem
-                        continue
-                    
-                    for kx in range(-radius, radius + 1):
-                        xx = x + kx  # Posição X do vizinho
-                        if xx < 0 or xx >= width:  # Ignora pixels fora da imagem
-                            continue
-                        
-                        # Multiplica peso do kernel pelo valor do pixel
-                        kernel_value = kernel[ky + radius][kx + radius]  # Peso (-1, 0, ou 4)
-                        pixel_value = pixels[yy * width + xx]  # Valor do pixel
-                        accumulator += kernel_value * pixel_value  # Soma ponderada
-                
-                # O Laplaciano pode gerar valores negativos
-                # Usamos clamping para manter valores no intervalo [0, 255]
-                result = max(0, min(255, accumulator))  # Clamp [0, 255]
-                output[y * width + x] = result
+
+        # Aplica o kernel Laplaciano (só os 5 pesos não nulos) na vizinhança
+        output = self.convolve(pixels, width, height, kernel, radius, border_mode or 'zero')
+
+        # O Laplaciano pode gerar valores negativos
+        # Usamos clamping para manter valores no intervalo [0, 255]
+        for i in range(len(output)):
+            output[i] = max(0, min(255, output[i]))  # Clamp [0, 255]
         
         return {
             "type": "image",
@@ -374,7 +718,7 @@ class ImageProcessor:
             "data": output
         }
     
-    def process_mean(self, pixels: List[int], width: int, height: int, window_size: int) -> Dict:
+    def process_mean(self, pixels: List[int], width: int, height: int, window_size: int, border_mode: Optional[str] = None) -> Dict:
         """
         ═══════════════════════════════════════════════════════════════
         FILTRO DE MÉDIA - Suaviza a imagem (blur)
@@ -419,35 +763,40 @@ class ImageProcessor:
         - Imagem com ruído gaussiano (aleatório)
         - Quer suavizar/desfocar a imagem
         - Não se importa em perder detalhes de bordas
+
+        BORDAS:
+        - Sem border_mode: média só dos pixels dentro da imagem
+        - Com border_mode: a imagem é preenchida e toda janela tem k×k pixels
         ═══════════════════════════════════════════════════════════════
         """
         output = [0] * (width * height)  # Imagem de saída
         radius = (window_size - 1) // 2  # Raio da janela (ex: 3x3 tem raio 1)
-        
-        # Percorre cada pixel da imagem
-        for y in range(height):
-            for x in range(width):
+
+        # Interior: soma por deslocamentos fixos, sem testes de borda
+        buffer, stride, x_range, y_range = self.window_source(pixels, width, height, radius, border_mode)
+        offsets = window_offsets(radius, stride)
+        count = len(offsets)  # Toda janela do interior tem k×k pixels
+        pad = radius if border_mode else 0
+
+        for y in y_range:
+            if y % TILE_ROWS == 0:
+                self.check_cancelled("durante a média")
+            row = (y + pad) * stride + pad
+            for x in x_range:
+                center = row + x
                 accumulator = 0  # Acumula soma dos pixels
-                count = 0  # Conta quantos pixels foram somados
-                
-                # PASSO 1: Soma todos os pixels válidos dentro da janela
-                for ky in range(-radius, radius + 1):
-                    yy = y + ky  # Posição Y do vizinho
-                    if yy < 0 or yy >= height:  # Ignora pixels fora da imagem
-                        continue
-                    
-                    for kx in range(-radius, radius + 1):
-                        xx = x + kx  # Posição X do vizinho
-                        if xx < 0 or xx >= width:  # Ignora pixels fora da imagem
-                            continue
-                        
-                        # Soma o valor do pixel
-                        accumulator += pixels[yy * width + xx]
-                        count += 1  # Incrementa contador
-                
-                # PASSO 2: Calcula a média (soma / quantidade)
-                mean_value = accumulator // count if count > 0 else 0
-                output[y * width + x] = mean_value
+                for offset in offsets:
+                    accumulator += buffer[center + offset]
+                output[y * width + x] = accumulator // count
+
+        # Borda (só sem border_mode): média apenas dos pixels válidos
+        if not border_mode:
+            for x, y in edge_coordinates(width, height, radius):
+                window_pixels = valid_window(pixels, width, height, x, y, radius)
+                accumulator = 0
+                for value in window_pixels:
+                    accumulator += value
+                output[y * width + x] = accumulator // len(window_pixels)
         
         return {
             "type": "image",
@@ -456,6 +805,136 @@ class ImageProcessor:
             "data": output
         }
 
+    def vhgw_1d(self, line: List[int], radius: int, take_min: bool, border_mode: Optional[str] = None) -> List[int]:
+        """
+        Mínimo/máximo deslizante em 1D pelo algoritmo de van Herk/Gil-Werman
+
+        A linha é dividida em blocos do tamanho da janela (k = 2*raio + 1):
+        - g: mínimo acumulado da esquerda para a direita dentro de cada bloco
+        - h: mínimo acumulado da direita para a esquerda dentro de cada bloco
+        Toda janela de tamanho k cobre o fim de um bloco e o início do próximo,
+        então seu mínimo é min(h[início], g[fim]).
+
+        Custo: 3 comparações por pixel, qualquer que seja o tamanho da janela.
+
+        Sem border_mode, as bordas são preenchidas com o elemento neutro (255
+        para mínimo, 0 para máximo): equivale a ignorar os pixels fora da imagem.
+        """
+        size = 2 * radius + 1
+        neutral = 255 if take_min else 0
+        length = len(line)
+
+        # Preenche para que a janela do pixel i comece em i e o total seja múltiplo de k
+        padded_length = length + 2 * radius
+        padded_length += (-padded_length) % size
+        if border_mode:
+            padded = pad_line(line, radius, border_mode)
+            padded += [neutral] * (padded_length - len(padded))
+        else:
+            padded = [neutral] * radius + list(line) + [neutral] * (padded_length - length - radius)
+
+        g = padded[:]
+        h = padded[:]
+        output = [0] * length
+
+        # A comparação é escolhida uma vez por chamada: os laços internos não têm desvios
+        if take_min:
+            for start in range(0, padded_length, size):
+                end = start + size
+                # g: acumula da esquerda para a direita (1 comparação por pixel)
+                for i in range(start + 1, end):
+                    if g[i - 1] < g[i]:
+                        g[i] = g[i - 1]
+                # h: acumula da direita para a esquerda (1 comparação por pixel)
+                for i in range(end - 2, start - 1, -1):
+                    if h[i + 1] < h[i]:
+                        h[i] = h[i + 1]
+            # Combina: janela [i, i + k - 1] (1 comparação por pixel)
+            for i in range(length):
+                left = h[i]
+                right = g[i + size - 1]
+                output[i] = left if left < right else right
+        else:
+            for start in range(0, padded_length, size):
+                end = start + size
+                for i in range(start + 1, end):
+                    if g[i - 1] > g[i]:
+                        g[i] = g[i - 1]
+                for i in range(end - 2, start - 1, -1):
+                    if h[i + 1] > h[i]:
+                        h[i] = h[i + 1]
+            for i in range(length):
+                left = h[i]
+                right = g[i + size - 1]
+                output[i] = left if left > right else right
+        return output
+
+    def rank_pass(self, buffer: List[int], width: int, height: int, radius: int, take_min: bool, border_mode: Optional[str] = None) -> None:
+        """
+        Erosão (mínimo) ou dilatação (máximo) 2D no próprio buffer
+
+        A janela quadrada é separável: mínimo nas linhas e depois nas colunas.
+        Cada linha/coluna é copiada antes de ser processada, então o
+        resultado pode ser escrito de volta no mesmo buffer. Todos os modos de
+        borda são separáveis (preencher linhas e depois colunas equivale a
+        preencher a imagem).
+        """
+        for y in range(height):
+            if y % TILE_ROWS == 0:
+                self.check_cancelled("durante o filtro de ordem")
+            row_start = y * width
+            buffer[row_start:row_start + width] = self.vhgw_1d(
+                buffer[row_start:row_start + width], radius, take_min, border_mode
+            )
+        for x in range(width):
+            if x % TILE_ROWS == 0:
+                self.check_cancelled("durante o filtro de ordem")
+            buffer[x::width] = self.vhgw_1d(buffer[x::width], radius, take_min, border_mode)
+
+    def process_rank_filter(self, pixels: List[int], width: int, height: int, window_size: int, filter_type: str, border_mode: Optional[str] = None) -> Dict:
+        """
+        ═══════════════════════════════════════════════════════════════
+        FILTROS DE ORDEM - Mínimo, Máximo, Abertura e Fechamento
+        ═══════════════════════════════════════════════════════════════
+
+        O QUE FAZ:
+        - MÍNIMO (erosão): cada pixel vira o MENOR valor da janela
+          → encolhe regiões claras, remove pontos brancos isolados
+        - MÁXIMO (dilatação): cada pixel vira o MAIOR valor da janela
+          → expande regiões claras, fecha buracos pretos pequenos
+        - ABERTURA: erosão seguida de dilatação
+          → remove ruído branco menor que a janela, preserva o resto
+        - FECHAMENTO: dilatação seguida de erosão
+          → preenche buracos pretos menores que a janela
+
+        QUANDO USAR:
+        - Limpar máscaras binárias depois da limiarização
+
+        COMO FUNCIONA (van Herk/Gil-Werman):
+        - A janela é separável: primeiro as linhas, depois as colunas
+        - Em cada linha, 3 comparações por pixel, seja a janela 3×3 ou 9×9
+        - Abertura/fechamento reutilizam o mesmo buffer nas duas etapas:
+          nenhum intermediário é criado entre a erosão e a dilatação
+        ═══════════════════════════════════════════════════════════════
+        """
+        radius = (window_size - 1) // 2
+
+        # Um único buffer de saída, processado no lugar por todas as passadas
+        output = list(pixels)
+        for take_min in RANK_FILTER_TYPES[filter_type]:
+            self.rank_pass(output, width, height, radius, take_min, border_mode)
+
+        mask = [[1 for _ in range(window_size)] for _ in range(window_size)]
+
+        return {
+            "type": "image",
+            "width": width,
+            "height": height,
+            "data": output,
+            "mask": mask,  # Máscara da janela usada
+            "maskSize": window_size
+        }
+
     def process_point_operation(self, node: Dict, inputs: List) -> Dict:
         """
         Operações pontuais: aplica transformação em cada pixel independentemente
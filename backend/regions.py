@@ -0,0 +1,231 @@
+"""
+Região de interesse (ROI): calcular só o recorte pedido de cada saída
+
+O cliente pede, para um nó de saída, apenas um retângulo (ex: 256×256 de
+uma imagem 10k×10k). O plano é montado de trás para frente no grafo:
+
+    saída pede R
+    → o filtro de raio r precisa da entrada em R + r (halo), limitado ao quadro
+    → o filtro anterior precisa de (R + r) + r', e assim por diante
+
+Cada nó então recebe as entradas recortadas na sua janela (saída + halo),
+roda normalmente sobre esse recorte e devolve só a parte da saída pedida.
+Os pixels da saída são idênticos aos do quadro inteiro: nas bordas internas
+do recorte o halo contém os vizinhos verdadeiros, e onde o recorte encosta
+na borda do quadro o modo de borda vale como antes.
+
+Exceção: o modo de borda 'wrap' lê pixels do lado oposto da imagem, então
+a entrada desse nó é sempre o quadro inteiro.
+
+Retângulos são tuplas (x, y, largura, altura) nas coordenadas do quadro.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cost import RANK_FILTER_PASSES
+
+Rect = Tuple[int, int, int, int]
+
+
+def propagate_sizes(
+    nodes: List[Dict],
+    edges: List[Dict],
+    reader_size: Callable[[Dict], Tuple[int, int]],
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Dimensões do quadro de cada nó, conhecidas antes da execução
+
+    Vêm dos nós de leitura (reader_size) e seguem pelas arestas: todos os
+    nós preservam as dimensões da sua primeira entrada. (0, 0) = desconhecida
+    """
+    nodes_dict = {node['id']: node for node in nodes}
+    inputs: Dict[str, List[str]] = {node_id: [] for node_id in nodes_dict}
+    for edge in edges:
+        if edge['target'] in inputs:
+            inputs[edge['target']].append(edge['source'])
+
+    sizes: Dict[str, Tuple[int, int]] = {}
+
+    def size_of(node_id: str, visiting: frozenset = frozenset()) -> Tuple[int, int]:
+        if node_id in sizes:
+            return sizes[node_id]
+        node = nodes_dict.get(node_id)
+        if node is None or node_id in visiting:  # Nó inexistente ou ciclo
+            return (0, 0)
+        if node['type'] == 'RAW_READER':
+            size = reader_size(node)
+        elif inputs[node_id]:
+            size = size_of(inputs[node_id][0], visiting | {node_id})
+        else:
+            size = (0, 0)
+        sizes[node_id] = size
+        return size
+
+    for node_id in nodes_dict:
+        size_of(node_id)
+    return sizes
+
+
+def halo_radius(node: Dict) -> Optional[int]:
+    """
+    Quantos pixels além da saída o nó lê da entrada (None = o quadro inteiro)
+    """
+    if node['type'] != 'CONVOLUTION':
+        return 0  # Operações pontuais, diferença, histograma, exibição, salvar
+
+    params = node.get('data', {})
+    if params.get('borderMode') == 'wrap':
+        return None
+
+    filter_type = params.get('filterType', 'convolution')
+    if filter_type == 'laplacian':
+        return 1
+    radius = (params.get('kernelSize', 3) - 1) // 2
+    return radius * RANK_FILTER_PASSES.get(filter_type, 1)  # Abertura/fechamento: duas passadas
+
+
+def clip(rect: Rect, width: int, height: int) -> Optional[Rect]:
+    """
+    Limita o retângulo ao quadro (None se ficar vazio)
+    """
+    x, y, w, h = rect
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(width, x + w), min(height, y + h)
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right - left, bottom - top)
+
+
+def bounding_box(rects: List[Rect]) -> Rect:
+    left = min(r[0] for r in rects)
+    top = min(r[1] for r in rects)
+    right = max(r[0] + r[2] for r in rects)
+    bottom = max(r[1] + r[3] for r in rects)
+    return (left, top, right - left, bottom - top)
+
+
+def plan_regions(
+    nodes_dict: Dict[str, Dict],
+    edges: List[Dict],
+    sorted_node_ids: List[str],
+    sizes: Dict[str, Tuple[int, int]],
+    regions: Dict[str, Dict[str, int]],
+    outputs: Optional[List[str]] = None,
+) -> Dict[str, Tuple[Rect, Rect]]:
+    """
+    Plano de recorte: {nó: (saída, janela)} só para nós que NÃO precisam do quadro inteiro
+
+    - saída: retângulo que o nó precisa produzir (região pedida e/ou o que
+      os consumidores leem dele)
+    - janela: retângulo em que as entradas são recortadas (saída + halo)
+
+    Nós sem região que são folhas do grafo, ou estão em `outputs`, precisam
+    do quadro inteiro. Lança ValueError para regiões vazias ou fora do quadro.
+    """
+    consumers: Dict[str, List[str]] = {node_id: [] for node_id in nodes_dict}
+    for edge in edges:
+        if edge['source'] in consumers and edge['target'] in nodes_dict:
+            consumers[edge['source']].append(edge['target'])
+
+    windows: Dict[str, Optional[Rect]] = {}  # Janela de entrada de cada nó (None = quadro inteiro)
+    plan = {}
+
+    for node_id in reversed(sorted_node_ids):
+        width, height = sizes.get(node_id, (0, 0))
+        frame = (0, 0, width, height)
+
+        needed: List[Optional[Rect]] = []
+        region = regions.get(node_id)
+        if region is not None:
+            rect = clip((region['x'], region['y'], region['width'], region['height']), width, height)
+            if rect is None and width and height:
+                raise ValueError(f"Região do nó {node_id} fora da imagem ({width}×{height})")
+            needed.append(rect)  # Quadro desconhecido: None (processa inteiro)
+        elif not consumers[node_id] or (outputs is not None and node_id in outputs):
+            needed.append(None)
+        needed.extend(windows[consumer] for consumer in consumers[node_id])
+
+        if not width or not height or any(rect is None for rect in needed):
+            windows[node_id] = None
+            continue
+
+        output = clip(bounding_box(needed), width, height)
+        halo = halo_radius(nodes_dict[node_id])
+        if halo is None:
+            window = None
+        else:
+            x, y, w, h = output
+            window = clip((x - halo, y - halo, w + 2 * halo, h + 2 * halo), width, height)
+            if window == frame:
+                window = None
+        windows[node_id] = window
+
+        if output != frame:
+            plan[node_id] = (output, window or frame)
+
+    return plan
+
+
+def region_of(result: Dict) -> Rect:
+    """
+    Retângulo (no quadro) coberto pelos pixels de um resultado
+    """
+    region = result.get('region')
+    if region is None:
+        return (0, 0, result['width'], result['height'])
+    return (region['x'], region['y'], region['width'], region['height'])
+
+
+def crop_pixels(data: Any, stride: int, origin: Tuple[int, int], rect: Rect) -> List[int]:
+    """
+    Copia as linhas de `rect` de um buffer cujo pixel (0, 0) está em `origin` no quadro
+    """
+    x, y, w, h = rect
+    left = x - origin[0]
+    output: List[int] = []
+    for row in range(y - origin[1], y - origin[1] + h):
+        start = row * stride + left
+        output.extend(data[start:start + w])
+    return output
+
+
+def crop_input(result: Any, window: Rect) -> Any:
+    """
+    Recorta uma entrada na janela do nó; o recorte passa a ser uma imagem
+    local (largura/altura da janela), que os filtros processam normalmente
+    """
+    if not isinstance(result, dict) or result.get('type') != 'image' or 'error' in result:
+        return result
+
+    covered = region_of(result)
+    if covered == window:
+        return {key: value for key, value in result.items() if key != 'region'}
+    if (window[0] < covered[0] or window[1] < covered[1]
+            or window[0] + window[2] > covered[0] + covered[2]
+            or window[1] + window[3] > covered[1] + covered[3]):
+        raise ValueError(f"Entrada não cobre a janela {window} (cobre {covered})")
+
+    cropped = {key: value for key, value in result.items() if key != 'region'}
+    cropped['data'] = crop_pixels(result['data'], result['width'], covered[:2], window)
+    cropped['width'], cropped['height'] = window[2], window[3]
+    return cropped
+
+
+def crop_output(result: Any, origin: Rect, output: Rect, frame: Tuple[int, int]) -> Any:
+    """
+    Reduz a saída de um nó (calculada sobre `origin`) ao retângulo pedido e
+    marca o resultado com a região e as dimensões do quadro inteiro
+    """
+    if not isinstance(result, dict) or 'error' in result:
+        return result
+
+    region = {
+        "x": output[0], "y": output[1], "width": output[2], "height": output[3],
+        "frameWidth": frame[0], "frameHeight": frame[1]
+    }
+    if result.get('type') != 'image' or result.get('data') is None:
+        return {**result, "region": region}  # Ex: histograma do recorte
+
+    data = result['data']
+    if origin != output:
+        data = crop_pixels(data, result['width'], origin[:2], output)
+    return {**result, "width": output[2], "height": output[3], "data": data, "region": region}
@@ -0,0 +1,212 @@
+"""
+Sessão de edição via WebSocket
+
+O grafo e os resultados intermediários ficam no servidor. O cliente envia o
+grafo completo uma vez ("init") e, a partir daí, só deltas (um parâmetro de
+nó alterado, uma aresta nova...). O servidor reprocessa apenas os nós
+afetados (os alterados e tudo abaixo deles) e devolve apenas as saídas que
+mudaram. Se um novo delta chega durante o processamento, a execução em
+andamento é cancelada no próximo nó e recomeça com o estado mais recente.
+
+Mensagens do cliente:
+- {"type": "init", "nodes": [...], "edges": [...]}
+- {"type": "update_node", "id": "...", "data": {...}}   (mescla em node.data)
+- {"type": "add_node", "node": {...}}
+- {"type": "remove_node", "id": "..."}
+- {"type": "add_edge", "edge": {...}}
+- {"type": "remove_edge", "id": "..."}
+
+Mensagens do servidor:
+- {"type": "results", "revision": n, "results": {id: resultado}, "removed": [ids]}
+- {"type": "error", "revision": n, "detail": "..."}
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from models import Edge, Node
+from processor import GraphCancelled, ImageProcessor, MemoryBudgetExceeded
+
+
+def comparable(result: Any) -> Any:
+    """
+    Resultado com os pixels num formato único para comparação: o mesmo
+    conteúdo pode vir como lista (calculado) ou bytes/memoryview (cache)
+    """
+    if not isinstance(result, dict) or result.get('data') is None:
+        return result
+    data = result['data']
+    try:
+        data = bytes(data)
+    except (TypeError, ValueError):  # Valores fora de 0-255: compara como lista
+        data = list(data)
+    return {**result, 'data': data}
+
+
+class EditingSession:
+    """
+    Estado de uma sessão: grafo, resultados e nós pendentes de reprocessamento
+    """
+
+    def __init__(self, processor: ImageProcessor, send: Callable[[Dict], Awaitable[None]]):
+        self.processor = processor
+        self.send = send
+        self.nodes: Dict[str, Dict] = {}
+        self.edges: List[Dict] = []
+        self.results: Dict[str, Any] = {}
+        self.dirty: Set[str] = set()  # Nós alterados desde o último resultado enviado
+        self.revision = 0  # Incrementada a cada delta; execuções antigas se cancelam
+        self._task: Optional[asyncio.Task] = None
+
+    # ============ DELTAS ============
+
+    def apply(self, message: Dict) -> None:
+        """
+        Aplica um delta ao grafo e marca os nós que precisam ser reprocessados
+
+        Os dicts de nós são substituídos (nunca alterados no lugar): a
+        execução em andamento trabalha sobre uma cópia rasa do estado
+        """
+        if not isinstance(message, dict):
+            raise ValueError("Mensagem deve ser um objeto JSON")
+        kind = message.get('type')
+
+        if kind == 'init':
+            nodes = [Node.model_validate(node).model_dump() for node in message.get('nodes', [])]
+            self.nodes = {node['id']: node for node in nodes}
+            self.edges = [Edge.model_validate(edge).model_dump() for edge in message.get('edges', [])]
+            self.results = {}
+            self.dirty = set(self.nodes)
+
+        elif kind == 'update_node':
+            node = self._get_node(message.get('id'))
+            data = message.get('data', {})
+            if not isinstance(data, dict):
+                raise ValueError("update_node: 'data' deve ser um objeto")
+            self.nodes[node['id']] = {**node, 'data': {**node['data'], **data}}
+            self.dirty.add(node['id'])
+
+        elif kind == 'add_node':
+            node = Node.model_validate(message.get('node')).model_dump()
+            self.nodes[node['id']] = node
+            self.dirty.add(node['id'])
+
+        elif kind == 'remove_node':
+            node = self._get_node(message.get('id'))
+            del self.nodes[node['id']]
+            self.dirty.discard(node['id'])
+            remaining = []
+            for edge in self.edges:
+                if edge['source'] == node['id']:
+                    self.dirty.add(edge['target'])  # Perdeu uma entrada
+                elif edge['target'] != node['id']:
+                    remaining.append(edge)
+            self.edges = remaining
+
+        elif kind == 'add_edge':
+            edge = Edge.model_validate(message.get('edge')).model_dump()
+            self._get_node(edge['source'])
+            self._get_node(edge['target'])
+            self.edges = self.edges + [edge]
+            self.dirty.add(edge['target'])
+
+        elif kind == 'remove_edge':
+            edge_id = message.get('id')
+            removed = [edge for edge in self.edges if edge['id'] == edge_id]
+            if not removed:
+                raise ValueError(f"Aresta desconhecida: {edge_id}")
+            self.edges = [edge for edge in self.edges if edge['id'] != edge_id]
+            self.dirty.update(edge['target'] for edge in removed)
+
+        else:
+            raise ValueError(f"Tipo de mensagem desconhecido: {kind}")
+
+    def _get_node(self, node_id: Any) -> Dict:
+        node = self.nodes.get(node_id) if isinstance(node_id, str) else None
+        if node is None:
+            raise ValueError(f"Nó desconhecido: {node_id}")
+        return node
+
+    def affected_nodes(self, edges: List[Dict]) -> Set[str]:
+        """
+        Nós sujos e todos os seus descendentes (busca em largura pelas arestas)
+        """
+        adjacency: Dict[str, List[str]] = {}
+        for edge in edges:
+            adjacency.setdefault(edge['source'], []).append(edge['target'])
+
+        affected = set(self.dirty)
+        queue = list(self.dirty)
+        while queue:
+            current = queue.pop()
+            for neighbor in adjacency.get(current, []):
+                if neighbor not in affected:
+                    affected.add(neighbor)
+                    queue.append(neighbor)
+        return affected
+
+    # ============ PROCESSAMENTO ============
+
+    async def handle(self, message: Dict) -> None:
+        """
+        Aplica o delta e (re)inicia o processamento, cancelando o anterior
+        """
+        self.apply(message)
+        self.revision += 1
+
+        if self._task is not None:
+            self._task.cancel()
+        self._task = asyncio.ensure_future(self._recompute(self.revision))
+
+    async def _recompute(self, revision: int) -> None:
+        nodes = list(self.nodes.values())
+        edges = list(self.edges)
+        affected = self.affected_nodes(edges)
+        reuse = {
+            node_id: result for node_id, result in self.results.items()
+            if node_id in self.nodes and node_id not in affected
+        }
+
+        try:
+            results = await run_in_threadpool(
+                self.processor.process_graph,
+                nodes,
+                edges,
+                reuse=reuse,
+                should_cancel=lambda: self.revision != revision,
+            )
+        except GraphCancelled:
+            return
+        except MemoryBudgetExceeded as e:
+            await self.send({"type": "error", "revision": revision, "detail": str(e)})
+            return
+
+        if revision != self.revision:
+            return  # Chegou um delta enquanto terminava: o próximo resultado substitui este
+        if set(results) - set(self.nodes):
+            await self.send({"type": "error", "revision": revision, "detail": results.get('error')})
+            return
+
+        changed = {
+            node_id: result for node_id, result in results.items()
+            if node_id in affected and comparable(self.results.get(node_id)) != comparable(result)
+        }
+        removed = [node_id for node_id in self.results if node_id not in results]
+
+        self.results = results
+        self.dirty = set()
+        await self.send({
+            "type": "results",
+            "revision": revision,
+            "results": changed,
+            "removed": removed
+        })
+
+    def close(self) -> None:
+        """
+        Encerra a sessão: a execução em andamento para no próximo nó
+        """
+        self.revision += 1
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1,259 @@
+"""
+Modo de perfilamento opcional: spans aninhados no formato Chrome trace-event
+
+Ativado por requisição (campo `profile` ou cabeçalho X-PSE-Profile), só se
+o servidor permitir (PSE_PROFILING=1). Cada
+span vira um evento "X" (início + duração, em microssegundos) com o pid e o
+tid de quem o executou, de modo que o arquivo gerado mostra em qual worker
+e em qual thread cada fase rodou. O arquivo abre em chrome://tracing ou em
+https://ui.perfetto.dev.
+
+Com o modo "cprofile", cada nó também roda sob cProfile: as funções mais
+caras vão nos argumentos do span do nó e o perfil completo é gravado num
+arquivo .prof ao lado do trace (ver pstats / snakeviz). O diretório guarda
+no máximo PSE_TRACE_MAX_FILES arquivos; os mais antigos são removidos.
+
+Desativado, o processador recebe o NULL_TRACER, cujos spans são um único
+objeto reutilizado que não faz nada (custo de uma chamada por fase).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+PROFILE_MODES = ('trace', 'cprofile')
+
+# Funções listadas nos argumentos do span de cada nó perfilado
+PROFILE_TOP_FUNCTIONS = 15
+
+
+def now_us() -> float:
+    """
+    Relógio dos eventos (microssegundos, monotônico)
+    """
+    return time.perf_counter_ns() / 1000
+
+
+def validate_profile_mode(mode: Optional[str]) -> Optional[str]:
+    if not mode:
+        return None
+    mode = mode.strip().lower()
+    if mode in ('1', 'true', 'on'):
+        return 'trace'
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilamento desconhecido: {mode} (use {', '.join(PROFILE_MODES)})")
+    return mode
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+class NullTracer:
+    """
+    Tracer desativado: nenhum evento é registrado
+    """
+    enabled = False
+
+    _span = _NullSpan()
+
+    def span(self, name: str, cat: str = 'graph', **args: Any) -> _NullSpan:
+        return self._span
+
+    def node(self, node_id: str, node_type: str) -> _NullSpan:
+        return self._span
+
+    def add_span(self, name: str, start_us: float, end_us: float, cat: str = 'http', **args: Any) -> None:
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+    """
+    Span ativo: o evento é registrado ao sair do bloco
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.add_span(self.name, self.start, now_us(), cat=self.cat, **self.args)
+        return False
+
+    def set(self, **args: Any) -> None:
+        """
+        Acrescenta argumentos conhecidos só durante o span (ex: acerto de cache)
+        """
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Coleta eventos de uma requisição (pode ser usado de várias threads)
+    """
+    enabled = True
+
+    def __init__(self, mode: str = 'trace', name: str = 'process'):
+        self.mode = mode
+        self.trace_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.events: List[Dict[str, Any]] = []
+        self.profiles: Dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, cat: str = 'graph', **args: Any) -> _Span:
+        return _Span(self, name, cat, args)
+
+    @contextmanager
+    def node(self, node_id: str, node_type: str) -> Iterator[_Span]:
+        """
+        Span do despacho de um nó (com cProfile no modo 'cprofile')
+        """
+        with self.span(f"node {node_id}", cat='node', nodeId=node_id, type=node_type) as span:
+            if self.mode != 'cprofile':
+                yield span
+                return
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # Outro profiler já ativo (ex: grafo concorrente no Python 3.12+)
+                span.set(profile="indisponível: outro profiler ativo")
+                yield span
+                return
+            try:
+                yield span
+            finally:
+                profiler.disable()
+                stats = pstats.Stats(profiler)
+                with self._lock:
+                    self.profiles[node_id] = stats
+                span.set(profile=self._top_functions(stats))
+
+    def _top_functions(self, stats: pstats.Stats) -> List[str]:
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        lines = output.getvalue().splitlines()
+        # Só a tabela (a partir do cabeçalho "ncalls ...")
+        header = next((i for i, line in enumerate(lines) if line.strip().startswith('ncalls')), 0)
+        return [line.strip() for line in lines[header:] if line.strip()]
+
+    def add_span(self, name: str, start_us: float, end_us: float, cat: str = 'http', **args: Any) -> None:
+        """
+        Registra um span medido externamente (ex: da chegada da requisição até o endpoint)
+        """
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start_us,
+            "dur": max(0.0, end_us - start_us),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self.events)
+
+        # Metadados: nomes legíveis para o processo (worker) e as threads
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"worker {pid}"}}]
+        for tid in sorted({event['tid'] for event in events}):
+            metadata.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": thread_names.get(tid, f"thread {tid}")}
+            })
+
+        return {
+            "traceEvents": metadata + sorted(events, key=lambda event: event['ts']),
+            "displayTimeUnit": "ms",
+            "otherData": {"traceId": self.trace_id, "name": self.name, "mode": self.mode}
+        }
+
+    def write(self, directory: str, max_files: int = 0) -> str:
+        """
+        Grava o trace (e os perfis .prof dos nós) e retorna o nome do JSON
+        (nunca o caminho completo, que não deve chegar ao cliente)
+        Com max_files, remove os arquivos mais antigos do diretório além do limite
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+        with self._lock:
+            profiles = dict(self.profiles)
+        for node_id, stats in profiles.items():
+            safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in node_id)
+            stats.dump_stats(os.path.join(directory, f"{self.trace_id}-{safe_id}.prof"))
+
+        if max_files:
+            prune_traces(directory, max_files)
+        return os.path.basename(path)
+
+
+def prune_traces(directory: str, max_files: int) -> None:
+    """
+    Mantém só os `max_files` arquivos (.json/.prof) mais recentes do diretório
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(('.json', '.prof')):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    entries.sort(reverse=True)
+    for _, path in entries[max_files:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Removido por outro worker
+
+
+class ArrivalTimeMiddleware:
+    """
+    Middleware ASGI que marca a chegada de cada requisição HTTP
+    (request.state.received_at, no relógio de now_us)
+
+    A diferença até a entrada no endpoint cobre a leitura do corpo e a
+    validação pelo pydantic
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            scope.setdefault('state', {})['received_at'] = now_us()
+        await self.app(scope, receive, send)
@@ -10,23 +10,40 @@ import {
   SelectTrigger,
   SelectValue,
 } from '@/components/ui/select'
-import type { ConvolutionNodeData } from '@/types'
+import type { BorderMode, ConvolutionNodeData, RankFilterType } from '@/types'
 import { PRESET_KERNELS, generateAverageKernel, generateLaplacianKernel } from '@/types'
 import { cn } from '@/lib/utils'
 
 const KERNEL_SIZES = [3, 5, 7, 9]
 
+// Presets de filtros de ordem → filterType do backend
+const RANK_FILTER_PRESETS: Record<string, RankFilterType> = {
+  minimum: 'minimo',
+  maximum: 'maximo',
+  opening: 'abertura',
+  closing: 'fechamento',
+}
+
+const BORDER_MODES: { value: BorderMode | 'default'; label: string }[] = [
+  { value: 'default', label: 'Padrão do filtro' },
+  { value: 'zero', label: 'Zero' },
+  { value: 'replicate', label: 'Replicar borda' },
+  { value: 'reflect', label: 'Espelhar' },
+  { value: 'wrap', label: 'Periódica' },
+]
+
 export default function ConvolutionNode({ data, id, selected }: NodeProps<ConvolutionNodeData>) {
   const [preset, setPreset] = useState(data.preset || 'average')
   const [kernelSize, setKernelSize] = useState(data.kernelSize || 3)
   const [kernel, setKernel] = useState(data.kernel || PRESET_KERNELS.average.kernel)
   const [divisor, setDivisor] = useState<number | string>(data.divisor || 9)
-  const [filterType, setFilterType] = useState<'convolution' | 'median'>(data.filterType || 'convolution')
+  const [borderMode, setBorderMode] = useState<BorderMode | 'default'>(data.borderMode || 'default')
+  const [filterType, setFilterType] = useState<NonNullable<ConvolutionNodeData['filterType']>>(data.filterType || 'convolution')
 
   const handlePresetChange = (presetKey: string) => {
     setPreset(presetKey)
     const isMedian = presetKey === 'median'
-    const newFilterType = isMedian ? 'median' : 'convolution'
+    const newFilterType = isMedian ? 'median' : RANK_FILTER_PRESETS[presetKey] ?? 'convolution'
     setFilterType(newFilterType)
 
     let kernelData
@@ -35,7 +52,7 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
     } else if (presetKey === 'laplacian') {
       kernelData = generateLaplacianKernel(kernelSize)
     } else {
-      // median - gera máscara de 1's para visualização
+      // median e filtros de ordem - gera máscara de 1's para visualização
       const medianMask = Array(kernelSize).fill(0).map(() => Array(kernelSize).fill(1))
       kernelData = { kernel: medianMask, divisor: 1 }
     }
@@ -62,7 +79,7 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
     } else if (preset === 'laplacian') {
       kernelData = generateLaplacianKernel(newSize)
     } else {
-      // median - gera máscara de 1's para visualização
+      // median e filtros de ordem - gera máscara de 1's para visualização
       const medianMask = Array(newSize).fill(0).map(() => Array(newSize).fill(1))
       kernelData = { kernel: medianMask, divisor: 1 }
     }
@@ -87,6 +104,14 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
     data.onChange?.(id, { kernel: newKernel } as Partial<ConvolutionNodeData>)
   }
 
+  const handleBorderModeChange = (value: string) => {
+    const mode = value as BorderMode | 'default'
+    setBorderMode(mode)
+    data.onChange?.(id, {
+      borderMode: mode === 'default' ? undefined : mode,
+    } as Partial<ConvolutionNodeData>)
+  }
+
   const handleDivisorChange = (value: string) => {
     // Permitir campo vazio para que o usuário possa apagar e digitar novo valor
     // Se vazio, usar 1 como padrão apenas no processamento
@@ -103,7 +128,9 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
     }
   }
 
-  const isMedianFilter = filterType === 'median'
+  // Filtros de janela (mediana e de ordem) não usam pesos nem divisor
+  const isMedianFilter = filterType !== 'convolution'
+  const isRankFilter = Object.values(RANK_FILTER_PRESETS).includes(filterType as RankFilterType)
 
   return (
     <div
@@ -160,6 +187,24 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
           </Select>
         </div>
 
+        <div>
+          <Label htmlFor={`border-${id}`} className="text-xs text-muted-foreground">
+            Bordas
+          </Label>
+          <Select value={borderMode} onValueChange={handleBorderModeChange}>
+            <SelectTrigger id={`border-${id}`} className="h-8 text-xs">
+              <SelectValue />
+            </SelectTrigger>
+            <SelectContent>
+              {BORDER_MODES.map((mode) => (
+                <SelectItem key={mode.value} value={mode.value} className="text-xs">
+                  {mode.label}
+                </SelectItem>
+              ))}
+            </SelectContent>
+          </Select>
+        </div>
+
         <div>
           <Label className="text-xs text-muted-foreground mb-1 block">
             {isMedianFilter ? `Janela ${kernelSize}×${kernelSize}` : `Kernel ${kernelSize}×${kernelSize}`}
@@ -203,12 +248,18 @@ export default function ConvolutionNode({ data, id, selected }: NodeProps<Convol
           </div>
         )}
 
-        {isMedianFilter && (
+        {isMedianFilter && !isRankFilter && (
           <div className="text-[10px] text-muted-foreground bg-secondary p-2 rounded">
             Filtro de mediana {kernelSize}×{kernelSize} - Coleta todos os pixels da janela
           </div>
         )}
 
+        {isRankFilter && (
+          <div className="text-[10px] text-muted-foreground bg-secondary p-2 rounded">
+            {PRESET_KERNELS[preset]?.name} {kernelSize}×{kernelSize} - 3 comparações por pixel (van Herk/Gil-Werman)
+          </div>
+        )}
+
         {!isMedianFilter && (
           <div className="text-[10px] text-muted-foreground bg-secondary p-2 rounded">
             {PRESET_KERNELS[preset]?.name} - Kernel editável
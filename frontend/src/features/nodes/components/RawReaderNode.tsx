@@ -44,6 +44,7 @@ export default function RawReaderNode({ data, id, selected }: NodeProps<RawReade
 
           data.onChange?.(id, {
             imageData: result.data,
+            imageId: result.imageId,
             width: result.width,
             height: result.height,
             filename: file.name,
@@ -67,6 +68,7 @@ export default function RawReaderNode({ data, id, selected }: NodeProps<RawReade
 
           data.onChange?.(id, {
             imageData: result.data,
+            imageId: result.imageId,
             width: result.width,
             height: result.height,
             filename: file.name,
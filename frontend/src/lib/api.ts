@@ -1,8 +1,17 @@
 import axios from "axios";
-import type { PSENode, PSEEdge, ProcessResponse } from "@/types";
+import type {
+  PSENode,
+  PSEEdge,
+  ProcessResponse,
+  SessionDelta,
+  SessionMessage,
+} from "@/types";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
 
+// Nós cujo resultado é usado pela interface; os demais são intermediários
+const OUTPUT_NODE_TYPES = ["DISPLAY", "HISTOGRAM", "SAVE"];
+
 const api = axios.create({
   baseURL: API_URL,
   headers: {
@@ -15,9 +24,14 @@ export async function processGraph(
   edges: PSEEdge[]
 ): Promise<ProcessResponse> {
   try {
+    const outputs = nodes
+      .filter((node) => OUTPUT_NODE_TYPES.includes(node.type ?? ""))
+      .map((node) => node.id);
+
     const response = await api.post<ProcessResponse>("/process", {
       nodes,
       edges,
+      outputs,
     });
 
     return response.data;
@@ -34,8 +48,10 @@ export async function processGraph(
 export async function uploadRawFile(
   file: File,
   width?: number,
-  height?: number
-): Promise<{ width: number; height: number; data: number[] }> {
+  height?: number,
+  maxWidth?: number,
+  maxHeight?: number
+): Promise<{ width: number; height: number; data: number[]; imageId?: string | null }> {
   try {
     const formData = new FormData();
     formData.append("file", file);
@@ -44,6 +60,8 @@ export async function uploadRawFile(
     const params = new URLSearchParams();
     if (width !== undefined) params.append("width", width.toString());
     if (height !== undefined) params.append("height", height.toString());
+    if (maxWidth !== undefined) params.append("max_width", maxWidth.toString());
+    if (maxHeight !== undefined) params.append("max_height", maxHeight.toString());
 
     const queryString = params.toString() ? `?${params.toString()}` : "";
 
@@ -64,6 +82,37 @@ export async function uploadRawFile(
   }
 }
 
+// Sessão de edição: envia o grafo uma vez e depois só deltas;
+// recebe apenas as saídas dos nós que mudaram
+export function openEditingSession(
+  onMessage: (message: SessionMessage) => void,
+  onClose?: () => void
+) {
+  const socket = new WebSocket(`${API_URL.replace(/^http/, "ws")}/ws/session`);
+  const pending: string[] = [];
+
+  socket.onopen = () => {
+    pending.splice(0).forEach((payload) => socket.send(payload));
+  };
+  socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+  socket.onclose = () => onClose?.();
+
+  const send = (delta: SessionDelta) => {
+    const payload = JSON.stringify(delta);
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(payload);
+    } else {
+      pending.push(payload);
+    }
+  };
+
+  return {
+    init: (nodes: PSENode[], edges: PSEEdge[]) => send({ type: "init", nodes, edges }),
+    send,
+    close: () => socket.close(),
+  };
+}
+
 export async function checkHealth(): Promise<{ status: string }> {
   try {
     const response = await api.get("/health");
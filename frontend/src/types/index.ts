@@ -25,6 +25,12 @@ export type NodeType =
 
 export type PointOperation = 'brightness' | 'threshold'
 
+// Filtros de ordem (morfologia): nomes aceitos pelo backend em filterType
+export type RankFilterType = 'minimo' | 'maximo' | 'abertura' | 'fechamento'
+
+// Tratamento de pixels fora da imagem nos filtros de vizinhança
+export type BorderMode = 'zero' | 'replicate' | 'reflect' | 'wrap'
+
 export interface KernelPreset {
   name: string
   size: number
@@ -43,6 +49,7 @@ export interface RawReaderNodeData extends BaseNodeData {
   width: number
   height: number
   imageData?: number[]
+  imageId?: string | null // Id no armazenamento compartilhado do backend
   filename?: string
 }
 
@@ -51,7 +58,8 @@ export interface ConvolutionNodeData extends BaseNodeData {
   kernel: number[][]
   divisor: number
   preset?: string
-  filterType?: 'convolution' | 'median'
+  filterType?: 'convolution' | 'median' | RankFilterType
+  borderMode?: BorderMode // Ausente = padrão do filtro
 }
 
 export interface PointOpNodeData extends BaseNodeData {
@@ -95,13 +103,57 @@ export type PSEEdge = Edge
 export interface ProcessRequest {
   nodes: PSENode[]
   edges: PSEEdge[]
+  outputs?: string[]
+  memoryBudget?: number
+  timeoutMs?: number
+  profile?: 'trace' | 'cprofile'
+  regions?: Record<string, Region>
+}
+
+export interface Region {
+  x: number
+  y: number
+  width: number
+  height: number
+}
+
+export interface NodeCost {
+  estimatedUnits: number
+  actualSeconds: number | null
+}
+
+export interface ProcessStats {
+  peakResidentBytes?: number
+  memoryBudget?: number | null
+  nodeSeconds?: Record<string, number>
+  cost?: {
+    estimatedUnits: number
+    actualSeconds: number
+    secondsPerUnit: number | null
+    nodes: Record<string, NodeCost>
+  }
 }
 
 export interface ProcessResponse {
   results: Record<string, ProcessResult>
   error?: string
+  stats?: ProcessStats
 }
 
+// ============ SESSÃO DE EDIÇÃO (WebSocket) ============
+
+export type SessionDelta =
+  | { type: 'init'; nodes: PSENode[]; edges: PSEEdge[] }
+  | { type: 'update_node'; id: string; data: Record<string, unknown> }
+  | { type: 'add_node'; node: PSENode }
+  | { type: 'remove_node'; id: string }
+  | { type: 'add_edge'; edge: PSEEdge }
+  | { type: 'remove_edge'; id: string }
+
+export type SessionMessage =
+  | { type: 'results'; revision: number; results: Record<string, ProcessResult>; removed: string[] }
+  | { type: 'error'; revision: number; detail: string }
+
 export interface ProcessResult {
   type: 'image' | 'histogram' | 'display' | 'save' | 'error'
   width?: number
@@ -111,6 +163,7 @@ export interface ProcessResult {
   histogram?: number[]
   filename?: string
   error?: string
+  region?: Region & { frameWidth: number; frameHeight: number }
 }
 
 // ============ PRESET KERNELS ============
@@ -180,6 +233,30 @@ export const PRESET_KERNELS: Record<string, KernelPreset> = {
     kernel: [[0, -1, 0], [-1, 4, -1], [0, -1, 0]],
     divisor: 1,
   },
+  minimum: {
+    name: 'Mínimo (Erosão)',
+    size: 3,
+    kernel: [[1, 1, 1], [1, 1, 1], [1, 1, 1]], // Janela de coleta
+    divisor: 1,
+  },
+  maximum: {
+    name: 'Máximo (Dilatação)',
+    size: 3,
+    kernel: [[1, 1, 1], [1, 1, 1], [1, 1, 1]],
+    divisor: 1,
+  },
+  opening: {
+    name: 'Abertura',
+    size: 3,
+    kernel: [[1, 1, 1], [1, 1, 1], [1, 1, 1]],
+    divisor: 1,
+  },
+  closing: {
+    name: 'Fechamento',
+    size: 3,
+    kernel: [[1, 1, 1], [1, 1, 1], [1, 1, 1]],
+    divisor: 1,
+  },
   // ============ FILTROS DESABILITADOS (Para referência) ============
   // average5x5: {
   //   name: 'Média 5x5',